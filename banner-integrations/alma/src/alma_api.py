@@ -0,0 +1,230 @@
+import json
+import time
+import random
+import logging
+import threading
+import http.client
+from collections import Counter
+from urllib.parse import urlsplit, quote
+from concurrent.futures import ThreadPoolExecutor
+
+# -------------------------------
+# Alma Users REST API delivery.
+# Changed users are pushed straight to Alma instead of waiting for the
+# scheduled SIS import. Each worker thread keeps one persistent HTTP
+# connection; a shared token bucket keeps the whole client under Alma's
+# per-second threshold, and 429/5xx responses are retried with backoff.
+# Creates (POST) are only retried when Alma refused them unprocessed, so a
+# lost response never creates the same user twice.
+# -------------------------------
+
+USERS_PATH = "/almaws/v1/users"
+
+# Requests per second across all workers (Alma's threshold is 25 per institution)
+DEFAULT_RATE_LIMIT = 20
+
+# Concurrent requests in flight
+DEFAULT_WORKERS = 8
+
+# Retries after the first attempt for 429, 5xx and connection errors (GET and PUT)
+DEFAULT_MAX_RETRIES = 5
+
+# Exponential backoff: BACKOFF_BASE * 2^attempt seconds, capped, with jitter
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+
+# Seconds to wait for a response
+REQUEST_TIMEOUT = 60
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Statuses after which a non-idempotent request (POST) is known not to have been processed
+UNPROCESSED_STATUSES = {429, 503}
+
+# Alma answers GET for an unknown user with 400 and this error code
+USER_NOT_FOUND_CODE = "401861"
+
+class AlmaApiError(Exception):
+    pass
+
+# -------------------------------
+# Token bucket shared by all worker threads
+# -------------------------------
+class RateLimiter:
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class AlmaUsersClient:
+    def __init__(self, base_url, api_key, rate_limit=DEFAULT_RATE_LIMIT, max_retries=DEFAULT_MAX_RETRIES,
+                 timeout=REQUEST_TIMEOUT):
+        url = urlsplit(base_url)
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise AlmaApiError(f"Invalid Alma API URL: {base_url}")
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = url.path.rstrip("/")
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate_limit)
+        self._local = threading.local()
+
+    # -------------------------------
+    # One keep-alive connection per worker thread
+    # -------------------------------
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            conn = conn_class(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def request(self, method, path, body=None, idempotent=True):
+        # Returns (status, response body, attempts); raises AlmaApiError if no response was received.
+        # Non-idempotent requests are retried on UNPROCESSED_STATUSES only, never after a connection error.
+        retry_statuses = RETRY_STATUSES if idempotent else UNPROCESSED_STATUSES
+        headers = {"Authorization": f"apikey {self.api_key}", "Accept": "application/xml"}
+        if body is not None:
+            headers["Content-Type"] = "application/xml"
+        status, data, error = None, b"", None
+        for attempt in range(1, self.max_retries + 2):
+            self.limiter.acquire()
+            retry_after = None
+            try:
+                conn = self._connection()
+                conn.request(method, f"{self.base_path}{path}", body=body, headers=headers)
+                response = conn.getresponse()
+                status, data = response.status, response.read()
+                retry_after = response.getheader("Retry-After")
+                if response.will_close:
+                    self._reset_connection()
+            except (http.client.HTTPException, OSError) as e:
+                self._reset_connection()
+                status, data, error = None, b"", e
+                if not idempotent:
+                    raise AlmaApiError(f"{method} {path} failed, not retried as the request may have been processed: {e}")
+            if status is not None and status not in retry_statuses:
+                return status, data, attempt
+            if attempt <= self.max_retries:
+                time.sleep(backoff_seconds(attempt, retry_after))
+        if status is None:
+            raise AlmaApiError(f"{method} {path} failed after {self.max_retries + 1} attempts: {error}")
+        return status, data, self.max_retries + 1
+
+    def user_exists(self, primary_id):
+        status, data, _ = self.request("GET", f"{USERS_PATH}/{quote(primary_id, safe='')}?view=brief")
+        if status == 200:
+            return True
+        if status == 404 or (status == 400 and USER_NOT_FOUND_CODE.encode() in data):
+            return False
+        raise AlmaApiError(f"GET user {primary_id} returned {status}: {error_message(data)}")
+
+    def create_user(self, payload):
+        return self.request("POST", f"{USERS_PATH}?social_authentication=false&send_pin_number_letter=false", payload,
+                            idempotent=False)
+
+    def update_user(self, primary_id, payload):
+        return self.request("PUT", f"{USERS_PATH}/{quote(primary_id, safe='')}?user_id_type=all_unique", payload)
+
+def backoff_seconds(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass  # HTTP-date form; fall back to exponential backoff
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+def error_message(data):
+    # Alma error bodies carry <errorMessage>; fall back to the start of the body
+    text = data.decode("utf-8", "replace")
+    start = text.find("<errorMessage>")
+    if start >= 0:
+        return text[start + len("<errorMessage>"):text.find("</errorMessage>", start)]
+    return text[:200]
+
+# -------------------------------
+# Push one batch: existence lookups first, then creates and updates
+# -------------------------------
+def lookup(client, primary_id):
+    try:
+        return client.user_exists(primary_id), None
+    except AlmaApiError as e:
+        return None, str(e)
+
+def failed_outcome(primary_id, error, status=None, attempts=None):
+    return {"primary_id": primary_id, "action": "failed", "status": status, "attempts": attempts, "error": error}
+
+def confirm_create(client, primary_id, error, status=None, attempts=None):
+    # A create that got no clear answer may still have gone through; a lookup settles it without resending
+    exists, _ = lookup(client, primary_id)
+    if exists:
+        logging.info(f"Alma API: user {primary_id} found after an unanswered create ({error})")
+        return {"primary_id": primary_id, "action": "created", "status": status, "attempts": attempts}
+    return failed_outcome(primary_id, error, status, attempts)
+
+def write_user(client, primary_id, payload, exists):
+    try:
+        if exists:
+            status, data, attempts = client.update_user(primary_id, payload)
+        else:
+            status, data, attempts = client.create_user(payload)
+    except AlmaApiError as e:
+        return failed_outcome(primary_id, str(e)) if exists else confirm_create(client, primary_id, str(e))
+    if 200 <= status < 300:
+        return {"primary_id": primary_id, "action": "updated" if exists else "created", "status": status, "attempts": attempts}
+    error = f"{'PUT' if exists else 'POST'} returned {status}: {error_message(data)}"
+    if not exists and status >= 500 and status not in UNPROCESSED_STATUSES:
+        return confirm_create(client, primary_id, error, status, attempts)
+    return failed_outcome(primary_id, error, status, attempts)
+
+def push_batch(client, executor, users):
+    # users: (primary_id, payload) pairs; returns one outcome per user in batch order
+    outcomes = [None] * len(users)
+    pending = []
+    for index, (primary_id, _) in enumerate(users):
+        if primary_id:
+            pending.append(index)
+        else:
+            outcomes[index] = failed_outcome(None, "missing primary_id")
+
+    # Decide create or update for the whole batch, then send the writes
+    writes = []
+    for index, (exists, error) in zip(pending, executor.map(lambda i: lookup(client, users[i][0]), pending)):
+        if exists is None:
+            outcomes[index] = failed_outcome(users[index][0], error)
+        else:
+            writes.append((index, exists))
+    for (index, _), outcome in zip(writes, executor.map(lambda w: write_user(client, *users[w[0]], w[1]), writes)):
+        outcomes[index] = outcome
+    return outcomes
+
+def deliver_users(batches, client, report_fh, workers=DEFAULT_WORKERS):
+    # Pipeline stage: pushes every batch and yields a Counter of outcomes per batch
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="alma-api") as executor:
+        for users in batches:
+            outcomes = push_batch(client, executor, users)
+            for outcome in outcomes:
+                report_fh.write(json.dumps(outcome) + "\n")
+                if outcome["action"] == "failed":
+                    logging.error(f"Alma API: user {outcome['primary_id']} failed: {outcome['error']}")
+            counts = Counter(outcome["action"] for outcome in outcomes)
+            logging.info(f"Alma API batch: {counts['created']} created, {counts['updated']} updated, {counts['failed']} failed")
+            yield counts
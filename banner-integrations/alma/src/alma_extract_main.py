@@ -1,359 +1,822 @@
-import os
-import zipfile
-import logging
-from logging.handlers import RotatingFileHandler
-from datetime import datetime
-import configparser
-import cx_Oracle
-from lxml import etree
-import shutil
-import time
-import argparse
-
-# -------------------------------
-# Resolve base directory of the project
-# -------------------------------
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-
-# -------------------------------
-# Initialize Oracle Client for Thick mode (only outside Docker)
-# -------------------------------
-running_in_docker = os.getenv("RUNNING_IN_DOCKER", "true").lower()
- 
-if running_in_docker != "true":
-
-# if os.getenv("RUNNING_IN_DOCKER") != "true":
-    instant_client_dir = r"C:\\oracle\\instantclient_21_19"
-    cx_Oracle.init_oracle_client(lib_dir=instant_client_dir)
-
-# -------------------------------
-# Load configuration from config.ini
-# -------------------------------
-def get_config():
-    config_path = os.path.join(BASE_DIR, "src", "config.ini")
-    config = configparser.ConfigParser()
-    config.read(config_path)
-    return config
-
-# -------------------------------
-# Parse command-line arguments
-# -------------------------------
-def parse_args():
-    parser = argparse.ArgumentParser(description="ALMA Extract Script")
-    parser.add_argument("--environment", required=True, choices=["DEV", "PREPROD", "PROD"], help="Target environment")
-    parser.add_argument("--network_dir", required=False, help="Optional network directory for ZIP delivery")
-    return parser.parse_args()
-
-# -------------------------------
-# Fetch source data
-# -------------------------------
-
-def fetch_students(conn):
-    cursor = conn.cursor()
-    pidms = ['372080', '375036', '376796', '379722', '383079',
-         '386411', '386566', '388566', '388941', '389411']
-
-    query = f"""
-    SELECT SPRIDEN_PIDM, SPRIDEN_ID, SPRIDEN_FIRST_NAME, SPRIDEN_MI, SPRIDEN_LAST_NAME,
-           USER_NAME, USER_TITLE, GENDER, USER_GROUP, CAMPUS_CODE, PREFERRED_LANGUAGE,
-           USER_BIRTH_DATE, EXPIRY_DATE, PURGE_DATE, BARCODE, STATUS
-    FROM ALMA_STUDENT_CHANGED
-    WHERE SPRIDEN_PIDM IN ({','.join([':{}'.format(i+1) for i in range(len(pidms))])})
-    """
-
-    cursor.execute(query, pidms)
-    # cursor.execute("SELECT SPRIDEN_PIDM, SPRIDEN_ID, SPRIDEN_FIRST_NAME, SPRIDEN_MI, SPRIDEN_LAST_NAME, USER_NAME, USER_TITLE, GENDER, USER_GROUP, CAMPUS_CODE, PREFERRED_LANGUAGE, USER_BIRTH_DATE, EXPIRY_DATE, PURGE_DATE, BARCODE, STATUS FROM ALMA_STUDENT_CHANGED WHERE SPRIDEN_PIDM IN (
-    # '372080'
-    # ,'375036'
-    # ,'376796'
-    # ,'379722'
-    # ,'383079'
-    # ,'386411'
-    # ,'386566'
-    # ,'388566'
-    # ,'388941'
-    # ,'389411'
-    # )")
-    columns = [col[0] for col in cursor.description]
-    return [dict(zip(columns, row)) for row in cursor.fetchall()]
-
-def preload_addresses(conn):
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT SPRADDR_PIDM, PREFERRED, SPRADDR_STREET_LINE1, SPRADDR_STREET_LINE2, SPRADDR_STREET_LINE3, SPRADDR_CITY, SPRADDR_STAT_CODE, SPRADDR_ZIP, ADDRESS_TYPE, START_DATE, END_DATE
-        FROM ALMA_ADDRESS_MA
-    """)
-    columns = [col[0] for col in cursor.description]
-    address_dict = {}
-    for row in cursor.fetchall():
-        pidm = row[0]
-        address_dict.setdefault(pidm, []).append(dict(zip(columns[1:], row[1:])))
-    return address_dict
-
-def preload_emails(conn):
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT EMAIL_PIDM, PREFERRED, EMAIL_ADDRESS, EMAIL_TYPE
-        FROM ALMA_EMAIL
-    """)
-    columns = [col[0] for col in cursor.description]
-    email_dict = {}
-    for row in cursor.fetchall():
-        pidm = row[0]
-        email_dict.setdefault(pidm, []).append(dict(zip(columns[1:], row[1:])))
-    return email_dict
-
-def preload_phones(conn):
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT PHONE_PIDM, PREFERRED, PHONE_NUMBER, PHONE_TYPE
-        FROM ALMA_PHONE_HOME
-    """)
-    columns = [col[0] for col in cursor.description]
-    phone_dict = {}
-    for row in cursor.fetchall():
-        pidm = row[0]
-        phone_dict.setdefault(pidm, []).append(dict(zip(columns[1:], row[1:])))
-    return phone_dict
-
-# -------------------------------
-# Build XML structure from student data
-# -------------------------------
-
-def add_element_if_value(parent, tag, value):
-    if value and str(value).strip():
-        etree.SubElement(parent, tag).text = str(value)
-
-def build_xml(students, address_dict, email_dict, phone_dict):
-    root = etree.Element("users")
-    for student in students:
-        user = etree.SubElement(root, "user")
-
-        # Mandatory and basic fields
-        etree.SubElement(user, "record_type").text = "PUBLIC"
-        add_element_if_value(user, "primary_id", student.get("SPRIDEN_ID"))
-        add_element_if_value(user, "first_name", student.get("SPRIDEN_FIRST_NAME"))
-        add_element_if_value(user, "middle_name", student.get("SPRIDEN_MI"))
-        add_element_if_value(user, "last_name", student.get("SPRIDEN_LAST_NAME"))
-        add_element_if_value(user, "full_name", student.get("USER_NAME"))
-        add_element_if_value(user, "user_title", student.get("USER_TITLE"))
-        add_element_if_value(user, "gender", student.get("GENDER"))
-        add_element_if_value(user, "user_group", student.get("USER_GROUP"))
-        add_element_if_value(user, "campus_code", student.get("CAMPUS_CODE"))
-        add_element_if_value(user, "preferred_language", student.get("PREFERRED_LANGUAGE"))
-        add_element_if_value(user, "birth_date", student.get("USER_BIRTH_DATE"))
-        add_element_if_value(user, "expiry_date", student.get("EXPIRY_DATE"))
-        add_element_if_value(user, "purge_date", student.get("PURGE_DATE"))
-        etree.SubElement(user, "account_type").text = "EXTERNAL"
-        add_element_if_value(user, "external_id", student.get("SPRIDEN_ID"))
-        add_element_if_value(user, "status", student.get("STATUS"))
-
-        # Contact Info
-        contact_info = etree.SubElement(user, "contact_info")
-
-        # Addresses
-        addresses_elem = etree.SubElement(contact_info, "addresses")
-        pidm = int(student["SPRIDEN_PIDM"])  # Ensure it's an integer
-        for addr in address_dict.get(pidm, []):
-        #for addr in address_dict.get(student["SPRIDEN_PIDM"], []):
-            address_elem = etree.SubElement(addresses_elem, "address")
-            if addr.get("PREFERRED"):
-                address_elem.set("preferred", str(addr.get("PREFERRED")).lower())
-            add_element_if_value(address_elem, "line1", addr.get("SPRADDR_STREET_LINE1"))
-            add_element_if_value(address_elem, "line2", addr.get("SPRADDR_STREET_LINE2"))
-            add_element_if_value(address_elem, "line3", addr.get("SPRADDR_STREET_LINE3"))
-            add_element_if_value(address_elem, "city", addr.get("SPRADDR_CITY"))
-            add_element_if_value(address_elem, "state_province", addr.get("SPRADDR_STAT_CODE"))
-            add_element_if_value(address_elem, "postal_code", addr.get("SPRADDR_ZIP"))
-            if addr.get("ADDRESS_TYPE"):
-                address_types_elem = etree.SubElement(address_elem, "address_types")
-                add_element_if_value(address_types_elem, "address_type", addr.get("ADDRESS_TYPE"))
-            add_element_if_value(address_elem, "start_date", addr.get("START_DATE"))
-            add_element_if_value(address_elem, "end_date", addr.get("END_DATE"))
-
-        # Emails
-        emails_elem = etree.SubElement(contact_info, "emails")
-        pidm = int(student["SPRIDEN_PIDM"])  # Ensure it's an integer
-        for email in email_dict.get(pidm, []):
-        #for email in email_dict.get(student["SPRIDEN_PIDM"], []):
-            email_elem = etree.SubElement(emails_elem, "email")
-            if email.get("PREFERRED"):
-                email_elem.set("preferred", str(email.get("PREFERRED")).lower())
-            add_element_if_value(email_elem, "email_address", email.get("EMAIL_ADDRESS"))
-            if email.get("EMAIL_TYPE"):
-                email_types_elem = etree.SubElement(email_elem, "email_types")
-                add_element_if_value(email_types_elem, "email_type", email.get("EMAIL_TYPE"))
-
-        # Phones
-        phones_elem = etree.SubElement(contact_info, "phones")
-        pidm = int(student["SPRIDEN_PIDM"])  # Ensure it's an integer
-        for phone in phone_dict.get(pidm, []):
-        #for phone in phone_dict.get(student["SPRIDEN_PIDM"], []):
-            phone_elem = etree.SubElement(phones_elem, "phone")
-            if phone.get("PREFERRED"):
-                phone_elem.set("preferred", str(phone.get("PREFERRED")).lower())
-            add_element_if_value(phone_elem, "phone_number", phone.get("PHONE_NUMBER"))
-            if phone.get("PHONE_TYPE"):
-                phone_types_elem = etree.SubElement(phone_elem, "phone_types")
-                add_element_if_value(phone_types_elem, "phone_type", phone.get("PHONE_TYPE"))
-
-        # User Identifiers
-        user_identifiers_elem = etree.SubElement(user, "user_identifiers")
-        if student.get("BARCODE"):
-            barcode_elem = etree.SubElement(user_identifiers_elem, "user_identifier")
-            etree.SubElement(barcode_elem, "id_type").text = "01"
-            add_element_if_value(barcode_elem, "value", student.get("BARCODE"))
-        if student.get("SPRIDEN_ID"):
-            spriden_elem = etree.SubElement(user_identifiers_elem, "user_identifier")
-            etree.SubElement(spriden_elem, "id_type").text = "02"
-            add_element_if_value(spriden_elem, "value", student.get("SPRIDEN_ID"))
-
-        # User Roles
-        user_roles_elem = etree.SubElement(user, "user_roles")
-        user_role_elem = etree.SubElement(user_roles_elem, "user_role")
-        etree.SubElement(user_role_elem, "status").text = "ACTIVE"
-        etree.SubElement(user_role_elem, "scope").text = "61UNI_ACU"
-        etree.SubElement(user_role_elem, "role_type").text = "200"
-
-        # Parameters block (always present)
-        parameters_elem = etree.SubElement(user_role_elem, "parameters")
-        parameter_elem = etree.SubElement(parameters_elem, "parameter")
-        etree.SubElement(parameter_elem, "type")
-        etree.SubElement(parameter_elem, "value")
-
-        # logging.info(f"Student PIDM: {student['SPRIDEN_PIDM']}")
-        # logging.info(f"Addresses found: {len(address_dict.get(int(student['SPRIDEN_PIDM']), []))}")
-        # logging.info(f"Emails found: {len(email_dict.get(int(student['SPRIDEN_PIDM']), []))}")
-        # logging.info(f"Phones found: {len(phone_dict.get(int(student['SPRIDEN_PIDM']), []))}")
-
-    return root
-
-# -------------------------------
-# Clean up XML content by removing unwanted declarations
-# -------------------------------
-def xml_cleanup(xml_path):
-    with open(xml_path, "r", encoding="utf-8") as f:
-        xml_content = f.read()
-    xml_content = xml_content.replace("<?xml version='1.0' encoding='UTF-8'?>", "")
-    with open(xml_path, "w", encoding="utf-8") as f:
-        f.write(xml_content)
-
-# -------------------------------
-# Remove files older than a specified number of days
-# -------------------------------
-def cleanup_old_files(folder_path, days=7):
-    cutoff_time = time.time() - (days * 86400)
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
-        if os.path.isfile(file_path) and os.path.getmtime(file_path) < cutoff_time:
-            os.remove(file_path)
-
-# -------------------------------
-# Main execution function
-# -------------------------------
-def main():
-    # Parse arguments and load config
-    args = parse_args()
-    config = get_config()
-    env_conf = config[args.environment]
-    delivery_conf = config["delivery"]
-
-    # Build Oracle DSN from config
-    dsn = f"{env_conf['db_url']}:{env_conf['db_port']}/{env_conf['db_name']}"
-
-    # Resolve local and log directories
-    local_dir = os.path.normpath(os.path.join(BASE_DIR, delivery_conf["local_dir"].strip('"')))
-    log_dir = os.path.normpath(os.path.join(BASE_DIR, delivery_conf["log_dir"].strip('"')))
-    os.makedirs(local_dir, exist_ok=True)
-    os.makedirs(log_dir, exist_ok=True)
-
-    # Setup logging with rotation
-    log_file_path = os.path.join(log_dir, "alma_oracle_export.log")
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s %(levelname)s %(message)s",
-        handlers=[
-            logging.StreamHandler(),
-            RotatingFileHandler(log_file_path, maxBytes=5*1024*1024, backupCount=3, encoding="utf-8")
-        ]
-    )
-
-    # Generate timestamped filename
-    timestamp = datetime.now().strftime("%d-%m-%Y-%H%M%S")
-    filename_prefix = delivery_conf['filename_prefix'].strip('"')
-    filename = f"{filename_prefix}-{timestamp}"
-    xml_path = os.path.join(local_dir, f"{filename}.xml")
-    zip_path = os.path.join(local_dir, f"{filename}.zip")
-
-    # Setup archive directory
-    archive_dir = os.path.join(local_dir, "archive")
-    os.makedirs(archive_dir, exist_ok=True)
-    archive_zip_path = os.path.join(archive_dir, os.path.basename(zip_path))
-
-    # Connect to Oracle and generate XML
-    try:
-        logging.info(f"Connecting to Oracle DB: {env_conf['db_name']}")
-        conn = cx_Oracle.connect(
-            user=env_conf["db_username"],
-            password=env_conf["db_password"],
-            dsn=dsn
-        )
-        students = fetch_students(conn)
-        logging.info(f"Fetched {len(students)} students")
-        address_dict = preload_addresses(conn)
-        email_dict = preload_emails(conn)
-        phone_dict = preload_phones(conn)
-        logging.info(f"Preloaded {sum(len(v) for v in address_dict.values())} addresses, {sum(len(v) for v in email_dict.values())} emails, {sum(len(v) for v in phone_dict.values())} phones")
-        xml_root = build_xml(students, address_dict, email_dict, phone_dict)
-        tree = etree.ElementTree(xml_root)
-        tree.write(xml_path, encoding="utf-8", xml_declaration=False, pretty_print=True)
-        conn.close()
-        logging.info(f"XML written to {xml_path}")
-    except Exception as e:
-        logging.error(f"Oracle or XML error: {e}")
-        return
-
-    # Clean up XML formatting
-    try:
-        xml_cleanup(xml_path)
-        logging.info("XML cleanup done")
-    except Exception as e:
-        logging.error(f"XML cleanup error: {e}")
-        return
-
-    # Zip the XML file
-    try:
-        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(xml_path, arcname=os.path.basename(xml_path))
-        logging.info(f"Zipped to {zip_path}")
-    except Exception as e:
-        logging.error(f"Zipping error: {e}")
-        return
-
-    # Archive the ZIP file
-    try:
-        shutil.copy2(zip_path, archive_zip_path)
-        logging.info(f"Archived to {archive_zip_path}")
-    except Exception as e:
-        logging.error(f"Archiving error: {e}")
-
-    # Optionally copy ZIP to network directory
-    if args.network_dir:
-        try:
-            network_zip_path = os.path.join(args.network_dir, os.path.basename(zip_path))
-            shutil.copy2(zip_path, network_zip_path)
-            logging.info(f"Delivered to {network_zip_path}")
-        except Exception as e:
-            logging.error(f"Network delivery error: {e}")
-    else:
-        logging.info("No network_dir provided. Skipping delivery.")
-
-    # Clean up old files from local directory
-    cleanup_old_files(local_dir, days=7)
-
-# -------------------------------
-# Entry point
-# -------------------------------
-if __name__ == "__main__":
-    main()
-
+import os
+import sys
+import logging
+from datetime import datetime
+import configparser
+from lxml import etree
+import time
+import hashlib
+import argparse
+import multiprocessing
+from collections import deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+# -------------------------------
+# Modules shared by the ALMA and OPAL jobs live in banner-integrations/shared
+# -------------------------------
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "shared"))
+
+from pipeline import PipelineError, Stage, run_pipeline, fetch_batches, write_through, write_all, compress_chunks, TeeWriter
+from db_adapter import get_db_adapter
+from stage_monitor import StageMonitor, MemoryBudgetExceeded, resolve_max_memory_mb
+from queue_logging import start_queue_logging
+from checkpoint import ExtractCheckpoint, CheckpointError
+from run_history import RunRecorder, history_path
+from archive_store import ArchiveStore, configured_retention_days
+from alma_api import AlmaUsersClient, AlmaApiError, deliver_users, DEFAULT_RATE_LIMIT, DEFAULT_WORKERS, DEFAULT_MAX_RETRIES
+
+# -------------------------------
+# Resolve base directory of the project
+# -------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# Students fetched per Oracle round trip and rendered per pipeline batch
+FETCH_ARRAYSIZE = 1000
+
+# Address, email and phone rows fetched per Oracle round trip by the preloads (the driver default is 100)
+PRELOAD_ARRAYSIZE = 1000
+
+# Batches in flight per render worker process
+RENDER_WINDOW_PER_WORKER = 2
+
+# Students per checkpoint partition when config.ini does not set checkpoint_partition_size (0 = off)
+DEFAULT_PARTITION_SIZE = 0
+
+# Students selected unless --all_students is given
+TEST_PIDMS = ['372080', '375036', '376796', '379722', '383079',
+              '386411', '386566', '388566', '388941', '389411']
+
+# -------------------------------
+# Load configuration from config.ini
+# -------------------------------
+def get_config():
+    config_path = os.path.join(BASE_DIR, "src", "config.ini")
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return config
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+def parse_pidm_list(text):
+    # "372080, 375036" -> [372080, 375036]; raises ValueError naming the first bad entry
+    pidms = []
+    for token in text.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        if not token.isdigit():
+            raise ValueError(f"invalid PIDM {token!r} in {text!r}, expected comma-separated numbers")
+        pidms.append(int(token))
+    return pidms
+
+def pidm_list_arg(text):
+    try:
+        return parse_pidm_list(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ALMA Extract Script")
+    parser.add_argument("--environment", required=True, choices=["DEV", "PREPROD", "PROD"], help="Target environment")
+    parser.add_argument("--network_dir", required=False, help="Optional network directory for ZIP delivery")
+    parser.add_argument("--all_students", action="store_true", help="Extract every changed student instead of the test PIDMs")
+    parser.add_argument("--sqlite_db", help="Read from a SQLite stand-in of the Banner views instead of Oracle")
+    parser.add_argument("--max_memory_mb", type=int, help="Abort if RSS exceeds this many MB (overrides config.ini, 0 = unlimited)")
+    parser.add_argument("--trace_memory", action="store_true", help="Also report traced Python allocations per stage (slower)")
+    parser.add_argument("--trace_every_n", type=int, help="Trace child row counts for PIDMs divisible by N (overrides config.ini, 0 = off)")
+    parser.add_argument("--trace_pidms", type=pidm_list_arg, help="Comma-separated PIDMs to trace (overrides config.ini)")
+    parser.add_argument("--resume", action="store_true", help="Resume the last failed run from its checkpoint")
+    parser.add_argument("--alma_api", action="store_true", help="Push users to the Alma Users API instead of writing the ZIP file drop")
+    parser.add_argument("--alma_api_url", help="Alma API base URL (overrides config.ini, e.g. a local stand-in)")
+    parser.add_argument("--render_workers", type=int, help="Render XML in this many worker processes (overrides config.ini, 0 = in-process)")
+    args = parser.parse_args()
+    if args.resume and args.alma_api:
+        parser.error("--resume continues a ZIP file drop; Alma API delivery keeps no checkpoint")
+    return args
+
+# -------------------------------
+# Fetch source data
+# -------------------------------
+
+def fetch_students(conn, pidms=TEST_PIDMS):
+    return [student for batch in fetch_student_batches(conn, pidms) for student in batch]
+
+def fetch_student_batches(conn, pidms=TEST_PIDMS, arraysize=FETCH_ARRAYSIZE, ordered=False, after_pidm=None):
+    # pidms=None selects every changed student; ordered/after_pidm support checkpoint partitions
+    cursor = conn.cursor()
+
+    query = """
+    SELECT SPRIDEN_PIDM, SPRIDEN_ID, SPRIDEN_FIRST_NAME, SPRIDEN_MI, SPRIDEN_LAST_NAME,
+           USER_NAME, USER_TITLE, GENDER, USER_GROUP, CAMPUS_CODE, PREFERRED_LANGUAGE,
+           USER_BIRTH_DATE, EXPIRY_DATE, PURGE_DATE, BARCODE, STATUS
+    FROM ALMA_STUDENT_CHANGED
+    """
+    params = list(pidms or [])
+    conditions = []
+    if pidms:
+        conditions.append(f"SPRIDEN_PIDM IN ({','.join([':{}'.format(i+1) for i in range(len(pidms))])})")
+    if after_pidm is not None:
+        params.append(after_pidm)
+        conditions.append(f"SPRIDEN_PIDM > :{len(params)}")
+    if conditions:
+        query += "WHERE " + " AND ".join(conditions)
+    if ordered:
+        query += " ORDER BY SPRIDEN_PIDM"
+
+    cursor.execute(query, params)
+    # cursor.execute("SELECT SPRIDEN_PIDM, SPRIDEN_ID, SPRIDEN_FIRST_NAME, SPRIDEN_MI, SPRIDEN_LAST_NAME, USER_NAME, USER_TITLE, GENDER, USER_GROUP, CAMPUS_CODE, PREFERRED_LANGUAGE, USER_BIRTH_DATE, EXPIRY_DATE, PURGE_DATE, BARCODE, STATUS FROM ALMA_STUDENT_CHANGED WHERE SPRIDEN_PIDM IN (
+    # '372080'
+    # ,'375036'
+    # ,'376796'
+    # ,'379722'
+    # ,'383079'
+    # ,'386411'
+    # ,'386566'
+    # ,'388566'
+    # ,'388941'
+    # ,'389411'
+    # )")
+    columns = [col[0] for col in cursor.description]
+    for rows in fetch_batches(cursor, arraysize):
+        yield [dict(zip(columns, row)) for row in rows]
+    cursor.close()
+
+# after_pidm: on resume, only rows for students not yet checkpointed are needed
+def pidm_filter(column, after_pidm):
+    return (f"WHERE {column} > :1", [after_pidm]) if after_pidm is not None else ("", [])
+
+def preload_addresses(conn, after_pidm=None):
+    cursor = conn.cursor()
+    cursor.arraysize = PRELOAD_ARRAYSIZE
+    where, params = pidm_filter("SPRADDR_PIDM", after_pidm)
+    cursor.execute(f"""
+        SELECT SPRADDR_PIDM, PREFERRED, SPRADDR_STREET_LINE1, SPRADDR_STREET_LINE2, SPRADDR_STREET_LINE3, SPRADDR_CITY, SPRADDR_STAT_CODE, SPRADDR_ZIP, ADDRESS_TYPE, START_DATE, END_DATE
+        FROM ALMA_ADDRESS_MA {where}
+    """, params)
+    columns = [col[0] for col in cursor.description]
+    address_dict = {}
+    for row in cursor.fetchall():
+        pidm = row[0]
+        address_dict.setdefault(pidm, []).append(dict(zip(columns[1:], row[1:])))
+    return address_dict
+
+def preload_emails(conn, after_pidm=None):
+    cursor = conn.cursor()
+    cursor.arraysize = PRELOAD_ARRAYSIZE
+    where, params = pidm_filter("EMAIL_PIDM", after_pidm)
+    cursor.execute(f"""
+        SELECT EMAIL_PIDM, PREFERRED, EMAIL_ADDRESS, EMAIL_TYPE
+        FROM ALMA_EMAIL {where}
+    """, params)
+    columns = [col[0] for col in cursor.description]
+    email_dict = {}
+    for row in cursor.fetchall():
+        pidm = row[0]
+        email_dict.setdefault(pidm, []).append(dict(zip(columns[1:], row[1:])))
+    return email_dict
+
+def preload_phones(conn, after_pidm=None):
+    cursor = conn.cursor()
+    cursor.arraysize = PRELOAD_ARRAYSIZE
+    where, params = pidm_filter("PHONE_PIDM", after_pidm)
+    cursor.execute(f"""
+        SELECT PHONE_PIDM, PREFERRED, PHONE_NUMBER, PHONE_TYPE
+        FROM ALMA_PHONE_HOME {where}
+    """, params)
+    columns = [col[0] for col in cursor.description]
+    phone_dict = {}
+    for row in cursor.fetchall():
+        pidm = row[0]
+        phone_dict.setdefault(pidm, []).append(dict(zip(columns[1:], row[1:])))
+    return phone_dict
+
+# -------------------------------
+# Build XML structure from student data
+# -------------------------------
+
+def add_element_if_value(parent, tag, value):
+    if value and str(value).strip():
+        etree.SubElement(parent, tag).text = str(value)
+
+# -------------------------------
+# Sampled per-student trace: every Nth PIDM and/or listed PIDMs.
+# Selection depends only on the PIDM, so it is the same however students are batched.
+# -------------------------------
+class StudentTrace:
+    def __init__(self, every_n=0, pidms=()):
+        self.every_n = every_n
+        self.pidms = set(pidms)
+
+    def __bool__(self):
+        return bool(self.every_n or self.pidms)
+
+    def wants(self, pidm):
+        return pidm in self.pidms or (self.every_n > 0 and pidm % self.every_n == 0)
+
+    @classmethod
+    def from_settings(cls, args, delivery_conf):
+        # CLI values override [delivery] trace_every_n / trace_pidms; raises ValueError for a malformed setting
+        every_n = args.trace_every_n
+        if every_n is None:
+            value = delivery_conf.get("trace_every_n", "0").strip('"').strip()
+            try:
+                every_n = int(value or 0)
+            except ValueError:
+                raise ValueError(f"invalid trace_every_n {value!r} in config.ini, expected a number")
+        pidms = args.trace_pidms
+        if pidms is None:
+            try:
+                pidms = parse_pidm_list(delivery_conf.get("trace_pidms", "").strip('"'))
+            except ValueError as e:
+                raise ValueError(f"trace_pidms in config.ini: {e}")
+        return cls(every_n, pidms)
+
+def log_trace(pidm, address_dict, email_dict, phone_dict):
+    logging.info(f"Trace PIDM {pidm}: {len(address_dict.get(pidm, []))} addresses, "
+                 f"{len(email_dict.get(pidm, []))} emails, {len(phone_dict.get(pidm, []))} phones")
+
+def build_user(parent, student, address_dict, email_dict, phone_dict, trace=None):
+    user = etree.SubElement(parent, "user") if parent is not None else etree.Element("user")
+
+    # Mandatory and basic fields
+    etree.SubElement(user, "record_type").text = "PUBLIC"
+    add_element_if_value(user, "primary_id", student.get("SPRIDEN_ID"))
+    add_element_if_value(user, "first_name", student.get("SPRIDEN_FIRST_NAME"))
+    add_element_if_value(user, "middle_name", student.get("SPRIDEN_MI"))
+    add_element_if_value(user, "last_name", student.get("SPRIDEN_LAST_NAME"))
+    add_element_if_value(user, "full_name", student.get("USER_NAME"))
+    add_element_if_value(user, "user_title", student.get("USER_TITLE"))
+    add_element_if_value(user, "gender", student.get("GENDER"))
+    add_element_if_value(user, "user_group", student.get("USER_GROUP"))
+    add_element_if_value(user, "campus_code", student.get("CAMPUS_CODE"))
+    add_element_if_value(user, "preferred_language", student.get("PREFERRED_LANGUAGE"))
+    add_element_if_value(user, "birth_date", student.get("USER_BIRTH_DATE"))
+    add_element_if_value(user, "expiry_date", student.get("EXPIRY_DATE"))
+    add_element_if_value(user, "purge_date", student.get("PURGE_DATE"))
+    etree.SubElement(user, "account_type").text = "EXTERNAL"
+    add_element_if_value(user, "external_id", student.get("SPRIDEN_ID"))
+    add_element_if_value(user, "status", student.get("STATUS"))
+
+    # Contact Info
+    contact_info = etree.SubElement(user, "contact_info")
+
+    # Addresses
+    addresses_elem = etree.SubElement(contact_info, "addresses")
+    pidm = int(student["SPRIDEN_PIDM"])  # Ensure it's an integer
+    for addr in address_dict.get(pidm, []):
+    #for addr in address_dict.get(student["SPRIDEN_PIDM"], []):
+        address_elem = etree.SubElement(addresses_elem, "address")
+        if addr.get("PREFERRED"):
+            address_elem.set("preferred", str(addr.get("PREFERRED")).lower())
+        add_element_if_value(address_elem, "line1", addr.get("SPRADDR_STREET_LINE1"))
+        add_element_if_value(address_elem, "line2", addr.get("SPRADDR_STREET_LINE2"))
+        add_element_if_value(address_elem, "line3", addr.get("SPRADDR_STREET_LINE3"))
+        add_element_if_value(address_elem, "city", addr.get("SPRADDR_CITY"))
+        add_element_if_value(address_elem, "state_province", addr.get("SPRADDR_STAT_CODE"))
+        add_element_if_value(address_elem, "postal_code", addr.get("SPRADDR_ZIP"))
+        if addr.get("ADDRESS_TYPE"):
+            address_types_elem = etree.SubElement(address_elem, "address_types")
+            add_element_if_value(address_types_elem, "address_type", addr.get("ADDRESS_TYPE"))
+        add_element_if_value(address_elem, "start_date", addr.get("START_DATE"))
+        add_element_if_value(address_elem, "end_date", addr.get("END_DATE"))
+
+    # Emails
+    emails_elem = etree.SubElement(contact_info, "emails")
+    pidm = int(student["SPRIDEN_PIDM"])  # Ensure it's an integer
+    for email in email_dict.get(pidm, []):
+    #for email in email_dict.get(student["SPRIDEN_PIDM"], []):
+        email_elem = etree.SubElement(emails_elem, "email")
+        if email.get("PREFERRED"):
+            email_elem.set("preferred", str(email.get("PREFERRED")).lower())
+        add_element_if_value(email_elem, "email_address", email.get("EMAIL_ADDRESS"))
+        if email.get("EMAIL_TYPE"):
+            email_types_elem = etree.SubElement(email_elem, "email_types")
+            add_element_if_value(email_types_elem, "email_type", email.get("EMAIL_TYPE"))
+
+    # Phones
+    phones_elem = etree.SubElement(contact_info, "phones")
+    pidm = int(student["SPRIDEN_PIDM"])  # Ensure it's an integer
+    for phone in phone_dict.get(pidm, []):
+    #for phone in phone_dict.get(student["SPRIDEN_PIDM"], []):
+        phone_elem = etree.SubElement(phones_elem, "phone")
+        if phone.get("PREFERRED"):
+            phone_elem.set("preferred", str(phone.get("PREFERRED")).lower())
+        add_element_if_value(phone_elem, "phone_number", phone.get("PHONE_NUMBER"))
+        if phone.get("PHONE_TYPE"):
+            phone_types_elem = etree.SubElement(phone_elem, "phone_types")
+            add_element_if_value(phone_types_elem, "phone_type", phone.get("PHONE_TYPE"))
+
+    # User Identifiers
+    user_identifiers_elem = etree.SubElement(user, "user_identifiers")
+    if student.get("BARCODE"):
+        barcode_elem = etree.SubElement(user_identifiers_elem, "user_identifier")
+        etree.SubElement(barcode_elem, "id_type").text = "01"
+        add_element_if_value(barcode_elem, "value", student.get("BARCODE"))
+    if student.get("SPRIDEN_ID"):
+        spriden_elem = etree.SubElement(user_identifiers_elem, "user_identifier")
+        etree.SubElement(spriden_elem, "id_type").text = "02"
+        add_element_if_value(spriden_elem, "value", student.get("SPRIDEN_ID"))
+
+    # User Roles
+    user_roles_elem = etree.SubElement(user, "user_roles")
+    user_role_elem = etree.SubElement(user_roles_elem, "user_role")
+    etree.SubElement(user_role_elem, "status").text = "ACTIVE"
+    etree.SubElement(user_role_elem, "scope").text = "61UNI_ACU"
+    etree.SubElement(user_role_elem, "role_type").text = "200"
+
+    # Parameters block (always present)
+    parameters_elem = etree.SubElement(user_role_elem, "parameters")
+    parameter_elem = etree.SubElement(parameters_elem, "parameter")
+    etree.SubElement(parameter_elem, "type")
+    etree.SubElement(parameter_elem, "value")
+
+    # Sampled trace; logging is queued, so the render loop never waits on file I/O
+    if trace and trace.wants(pidm):
+        log_trace(pidm, address_dict, email_dict, phone_dict)
+
+    return user
+
+def build_xml(students, address_dict, email_dict, phone_dict, trace=None):
+    root = etree.Element("users")
+    for student in students:
+        build_user(root, student, address_dict, email_dict, phone_dict, trace)
+    return root
+
+# -------------------------------
+# Render batches of students to <user> XML, one bytes chunk per batch.
+# The output is byte-identical to writing build_xml()'s tree with pretty_print.
+# -------------------------------
+def render_user_bytes(students, address_dict, email_dict, phone_dict, trace=None):
+    chunk = []
+    for student in students:
+        user = build_user(None, student, address_dict, email_dict, phone_dict, trace)
+        etree.indent(user, space="  ", level=1)
+        chunk.append(b"  " + etree.tostring(user, encoding="utf-8") + b"\n")
+    return b"".join(chunk)
+
+# -------------------------------
+# Multicore rendering: each batch is rendered in a worker process that
+# receives only the address, email and phone rows of its own students.
+# Results are collected in submission order, so output is byte-identical.
+# -------------------------------
+def render_shard(students, addresses, emails, phones):
+    return render_user_bytes(students, addresses, emails, phones)
+
+def shard_rows(students, row_dict):
+    rows = {}
+    for student in students:
+        pidm = int(student["SPRIDEN_PIDM"])
+        if pidm in row_dict:
+            rows[pidm] = row_dict[pidm]
+    return rows
+
+def open_render_pool(workers):
+    # spawn: workers start clean instead of forking a process with pipeline threads running
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def rendered_batches(batches, address_dict, email_dict, phone_dict, trace=None, pool=None, workers=0):
+    # Yields (students, chunk) per batch in fetch order
+    if pool is None:
+        for students in batches:
+            yield students, render_user_bytes(students, address_dict, email_dict, phone_dict, trace)
+        return
+    pending = deque()
+    try:
+        for students in batches:
+            # Trace in this process; worker processes do not share the log queue
+            if trace:
+                for student in students:
+                    pidm = int(student["SPRIDEN_PIDM"])
+                    if trace.wants(pidm):
+                        log_trace(pidm, address_dict, email_dict, phone_dict)
+            pending.append((students, pool.submit(
+                render_shard, students, shard_rows(students, address_dict),
+                shard_rows(students, email_dict), shard_rows(students, phone_dict))))
+            if len(pending) >= workers * RENDER_WINDOW_PER_WORKER:
+                done, future = pending.popleft()
+                yield done, future.result()
+        while pending:
+            done, future = pending.popleft()
+            yield done, future.result()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+def render_users(batches, address_dict, email_dict, phone_dict, counts, trace=None, pool=None, workers=0):
+    counts["students"] = 0
+    for students, chunk in rendered_batches(batches, address_dict, email_dict, phone_dict, trace, pool, workers):
+        if counts["students"] == 0 and students:
+            yield b"<users>\n"
+        counts["students"] += len(students)
+        yield chunk
+    yield b"</users>\n" if counts["students"] else b"<users/>\n"
+
+# -------------------------------
+# Checkpointed rendering: batches are rendered without the <users> wrapper and
+# tagged with their last PIDM; checkpoint_users saves them in partitions and
+# frames saved partitions followed by new batches as one <users> document.
+# -------------------------------
+def render_user_batches(batches, address_dict, email_dict, phone_dict, trace=None, pool=None, workers=0):
+    for students, chunk in rendered_batches(batches, address_dict, email_dict, phone_dict, trace, pool, workers):
+        if students:
+            yield len(students), int(students[-1]["SPRIDEN_PIDM"]), chunk
+
+def checkpoint_users(batches, checkpoint, counts):
+    counts["students"] = checkpoint.students_done
+    try:
+        if counts["students"]:
+            yield b"<users>\n"
+            yield from checkpoint.replay()
+        for students, last_pidm, chunk in batches:
+            checkpoint.add(chunk, students, last_pidm)
+            if counts["students"] == 0:
+                yield b"<users>\n"
+            counts["students"] += students
+            yield chunk
+        checkpoint.commit()
+    except BaseException:
+        checkpoint.abandon()
+        raise
+    yield b"</users>\n" if counts["students"] else b"<users/>\n"
+
+# -------------------------------
+# Best-effort output: a failure is logged once and later writes are dropped
+# -------------------------------
+class OptionalWriter:
+    # Written under a .part name and renamed once complete, so readers never see a partial file
+    def __init__(self, path, label):
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.label = label
+        self.fileobj = None
+        self.failed = False
+        try:
+            self.fileobj = open(self.part_path, "wb")
+        except Exception as e:
+            self.fail(e)
+
+    def fail(self, error):
+        self.failed = True
+        logging.error(f"{self.label} error: {error}")
+
+    def write(self, data):
+        if not self.failed:
+            try:
+                self.fileobj.write(data)
+            except Exception as e:
+                self.fail(e)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        # Publish the copy, or remove the partial file if this output failed
+        if not self.fileobj:
+            return False
+        try:
+            self.fileobj.close()
+            if not self.failed:
+                os.replace(self.part_path, self.path)
+        except Exception as e:
+            self.fail(e)
+        if self.failed and os.path.exists(self.part_path):
+            try:
+                os.remove(self.part_path)
+            except OSError:
+                pass
+        return not self.failed
+
+# -------------------------------
+# Stream students through render, write, zip and deliver stages
+# -------------------------------
+def extract_to_zip(conn, xml_path, zip_path, copy_paths, address_dict, email_dict, phone_dict, pidms=TEST_PIDMS,
+                   trace=None, checkpoint=None, render_workers=0):
+    # copy_paths: (label, path) pairs receiving the zip on a best-effort basis
+    # checkpoint: ExtractCheckpoint to save rendered partitions to and replay them from
+    # render_workers: worker processes for rendering (0 renders in the render stage thread)
+    # Returns the student count, the copy paths delivered and the SHA-256 of the XML
+    counts = {}
+    copies = []
+    pool = None
+    digest = hashlib.sha256()
+    if checkpoint:
+        render_stages = [
+            Stage("fetch", lambda: fetch_student_batches(conn, pidms, ordered=True, after_pidm=checkpoint.last_pidm)),
+            Stage("render", lambda batches: render_user_batches(batches, address_dict, email_dict, phone_dict, trace, pool, render_workers)),
+            Stage("checkpoint", lambda batches: checkpoint_users(batches, checkpoint, counts)),
+        ]
+    else:
+        render_stages = [
+            Stage("fetch", lambda: fetch_student_batches(conn, pidms)),
+            Stage("render", lambda batches: render_users(batches, address_dict, email_dict, phone_dict, counts, trace, pool, render_workers)),
+        ]
+    try:
+        with ExitStack() as stack:
+            xml_fh = stack.enter_context(open(xml_path, "wb"))
+            zip_fh = stack.enter_context(open(zip_path, "wb"))
+            copies = [OptionalWriter(path, label) for label, path in copy_paths]
+            if render_workers > 0:
+                pool = stack.enter_context(open_render_pool(render_workers))
+            run_pipeline(render_stages + [
+                Stage("write", lambda chunks: write_through(hash_chunks(chunks, digest), xml_fh)),
+                Stage("compress", lambda chunks: compress_chunks(chunks, "zip", os.path.basename(xml_path))),
+                Stage("deliver", lambda chunks: write_all(chunks, TeeWriter([zip_fh] + copies))),
+            ])
+    except BaseException:
+        # Drop partial outputs; a failed or aborted run must not leave a truncated deliverable
+        for copy in copies:
+            copy.failed = True
+            copy.close()
+        for path in (xml_path, zip_path):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    delivered = [copy.path for copy in copies if copy.close()]
+    return counts.get("students", 0), delivered, digest.hexdigest()
+
+def hash_chunks(chunks, digest):
+    # Hash the XML as it is written, so archiving does not read it back to hash it
+    for data in chunks:
+        digest.update(data)
+        yield data
+
+# -------------------------------
+# Alma Users API delivery: one <user> payload per student, as build_xml renders it
+# -------------------------------
+def render_payloads(batches, address_dict, email_dict, phone_dict, counts, trace=None):
+    counts["students"] = 0
+    for students in batches:
+        counts["students"] += len(students)
+        yield [(str(student["SPRIDEN_ID"]) if student.get("SPRIDEN_ID") else None,
+                etree.tostring(build_user(None, student, address_dict, email_dict, phone_dict, trace), encoding="utf-8"))
+               for student in students]
+
+def deliver_to_api(conn, client, report_path, address_dict, email_dict, phone_dict, pidms=TEST_PIDMS, trace=None,
+                   workers=DEFAULT_WORKERS):
+    # Returns the student count and a Counter of created/updated/failed users
+    counts = {}
+    with open(report_path, "w", encoding="utf-8") as report_fh:
+        outcomes = run_pipeline([
+            Stage("fetch", lambda: fetch_student_batches(conn, pidms)),
+            Stage("render", lambda batches: render_payloads(batches, address_dict, email_dict, phone_dict, counts, trace)),
+            Stage("api", lambda batches: deliver_users(batches, client, report_fh, workers)),
+        ])
+    return counts.get("students", 0), sum(outcomes, Counter())
+
+def run_api_delivery(args, env_conf, delivery_conf, db_adapter, pidms, trace, local_dir, filename):
+    def setting(name, default):
+        return int(delivery_conf.get(name, str(default)).strip('"').strip() or default)
+
+    # Check the API settings before connecting to Oracle; ALMA_API_KEY keeps the key out of config.ini
+    api_url = args.alma_api_url or env_conf.get("alma_api_url", "").strip('"').strip()
+    api_key = os.environ.get("ALMA_API_KEY") or env_conf.get("alma_api_key", "").strip('"').strip()
+    if not api_url or not api_key:
+        logging.error(f"Alma API delivery needs alma_api_url and alma_api_key in [{args.environment}] of config.ini "
+                      f"(or --alma_api_url and the ALMA_API_KEY environment variable)")
+        return 1
+    try:
+        client = AlmaUsersClient(api_url, api_key, setting("alma_api_rate_limit", DEFAULT_RATE_LIMIT),
+                                 setting("alma_api_max_retries", DEFAULT_MAX_RETRIES))
+    except AlmaApiError as e:
+        logging.error(str(e))
+        return 1
+
+    report_dir = os.path.join(local_dir, "api_reports")
+    os.makedirs(report_dir, exist_ok=True)
+    report_path = os.path.join(report_dir, f"{filename}-alma-api.jsonl")
+    with monitored_run(args, delivery_conf, db_adapter, local_dir, "alma_api", run_mode(args, pidms)) as (monitor, recorder):
+        try:
+            logging.info(f"Delivering to Alma Users API at {api_url}, max {setting('alma_api_rate_limit', DEFAULT_RATE_LIMIT)} requests/s")
+            conn, address_dict, email_dict, phone_dict = connect_and_preload(db_adapter, monitor)
+            with monitor.stage("api_delivery"):
+                student_count, outcomes = deliver_to_api(conn, client, report_path, address_dict, email_dict, phone_dict,
+                                                         pidms, trace, setting("alma_api_workers", DEFAULT_WORKERS))
+            conn.close()
+            recorder.add(rows=student_count)
+            # Every user failing (a bad API key, say) fails the run, not just part of it
+            all_failed = student_count > 0 and outcomes["failed"] == student_count
+            recorder.status = "failed" if all_failed else "partial" if outcomes["failed"] else "ok"
+        except MemoryBudgetExceeded as e:
+            logging.error(f"Aborted: {e}")
+            recorder.status = "aborted"
+            return 1
+        except Exception as e:
+            logging.error(f"Oracle or Alma API error: {e}")
+            return 1
+    monitor.log_summary()
+
+    logging.info(f"Alma API delivery: {student_count} students, {outcomes['created']} created, "
+                 f"{outcomes['updated']} updated, {outcomes['failed']} failed")
+    logging.info(f"Per-user outcomes written to {report_path}")
+    cleanup_old_files(report_dir, days=7)
+    return 1 if all_failed else 0
+
+# -------------------------------
+# Remove files older than a specified number of days
+# -------------------------------
+def cleanup_old_files(folder_path, days=7):
+    cutoff_time = time.time() - (days * 86400)
+    for file_name in os.listdir(folder_path):
+        file_path = os.path.join(folder_path, file_name)
+        if os.path.isfile(file_path) and os.path.getmtime(file_path) < cutoff_time:
+            os.remove(file_path)
+
+def archive_deliverable(archive, xml_path, zip_path, xml_sha256=None):
+    # The XML is archived once per distinct content; restore rebuilds the ZIP around it
+    try:
+        entry, stored = archive.add(xml_path, os.path.basename(zip_path), "zip", os.path.basename(xml_path), xml_sha256)
+    except OSError as e:
+        logging.error(f"Archiving failed: {e}")
+        return False
+    state = "unchanged, already stored" if stored else "stored"
+    logging.info(f"Archived {os.path.basename(zip_path)} as blob {entry['sha256'][:12]} ({state})")
+    return True
+
+# -------------------------------
+# Orchestration shared by the ZIP file drop and Alma API delivery
+# -------------------------------
+@contextmanager
+def monitored_run(args, delivery_conf, db_adapter, local_dir, job, mode):
+    # Per-stage peak memory, aborting if the budget is exceeded, and the run history
+    # record (row count, sizes and stage timings), saved however the run ends
+    monitor = StageMonitor(resolve_max_memory_mb(args.max_memory_mb, delivery_conf), args.trace_memory).start()
+    recorder = RunRecorder(history_path(local_dir), job, args.environment, mode, db_adapter.name)
+    try:
+        yield monitor, recorder
+    finally:
+        monitor.stop()
+        recorder.save(monitor.stages)
+
+def connect_and_preload(db_adapter, monitor, resume_after=None):
+    # Returns the connection and the address, email and phone rows of the students after resume_after
+    logging.info(f"Connecting to Oracle DB: {db_adapter.describe()}")
+    with monitor.stage("connect"):
+        conn = db_adapter.connect()
+    with monitor.stage("preload"):
+        address_dict = preload_addresses(conn, resume_after)
+        email_dict = preload_emails(conn, resume_after)
+        phone_dict = preload_phones(conn, resume_after)
+    logging.info(f"Preloaded {sum(len(v) for v in address_dict.values())} addresses, {sum(len(v) for v in email_dict.values())} emails, {sum(len(v) for v in phone_dict.values())} phones")
+    return conn, address_dict, email_dict, phone_dict
+
+def run_mode(args, pidms, render_workers=0):
+    # Runs are only compared with runs of the same mode in the run history
+    mode = "all_students" if pidms is None else "test_pidms"
+    if args.resume:
+        mode += ", resumed"
+    if render_workers > 0:
+        mode += f", {render_workers} render workers"
+    return mode
+
+def log_resume_hint(checkpoint):
+    if checkpoint:
+        logging.info(f"Checkpoint kept with {checkpoint.students_done} rendered students; "
+                     f"run again with --resume to continue run {checkpoint.run_name}")
+
+# -------------------------------
+# Main execution function
+# -------------------------------
+def main():
+    # Returns the exit status: 0 once the XML is archived and delivered, otherwise 1
+    # Parse arguments and load config
+    args = parse_args()
+    config = get_config()
+    env_conf = config[args.environment]
+    delivery_conf = config["delivery"]
+
+    # Oracle, or the SQLite stand-in when --sqlite_db is given
+    db_adapter = get_db_adapter(env_conf, args.sqlite_db)
+    pidms = None if args.all_students else TEST_PIDMS
+
+    # Resolve local and log directories
+    local_dir = os.path.normpath(os.path.join(BASE_DIR, delivery_conf["local_dir"].strip('"')))
+    log_dir = os.path.normpath(os.path.join(BASE_DIR, delivery_conf["log_dir"].strip('"')))
+    os.makedirs(local_dir, exist_ok=True)
+    os.makedirs(log_dir, exist_ok=True)
+
+    # Setup logging with rotation, written by a background listener
+    log_file_path = os.path.join(log_dir, "alma_oracle_export.log")
+    start_queue_logging(log_file_path)
+    try:
+        trace = StudentTrace.from_settings(args, delivery_conf)
+    except ValueError as e:
+        logging.error(f"Student trace settings error: {e}")
+        return 1
+    if trace:
+        logging.info(f"Sampled student trace enabled: every_n={trace.every_n}, {len(trace.pidms)} listed PIDMs")
+
+    # Generate timestamped filename
+    timestamp = datetime.now().strftime("%d-%m-%Y-%H%M%S")
+    filename_prefix = delivery_conf['filename_prefix'].strip('"')
+    filename = f"{filename_prefix}-{timestamp}"
+
+    # Direct Alma Users API delivery replaces the ZIP file drop
+    if args.alma_api:
+        return run_api_delivery(args, env_conf, delivery_conf, db_adapter, pidms, trace, local_dir, filename)
+
+    # Checkpoint rendered partitions so a failed run can be resumed (partition size 0 disables)
+    checkpoint_dir = os.path.join(local_dir, "checkpoint")
+    partition_size = int(delivery_conf.get("checkpoint_partition_size", str(DEFAULT_PARTITION_SIZE)).strip('"').strip() or 0)
+    selection = "all" if pidms is None else list(pidms)
+    checkpoint = None
+    try:
+        if args.resume:
+            checkpoint = ExtractCheckpoint.load(checkpoint_dir)
+            if checkpoint is None:
+                logging.error(f"No checkpoint to resume in {checkpoint_dir}")
+                return 1
+            if checkpoint.state["selection"] != selection:
+                logging.error(f"Checkpoint of run {checkpoint.run_name} was taken with a different student selection; "
+                              f"rerun with the same --all_students setting or without --resume")
+                return 1
+            # The resumed run completes the original deliverable name
+            filename = checkpoint.run_name
+            logging.info(f"Resuming run {filename} from checkpoint: {checkpoint.students_done} students in "
+                         f"{len(checkpoint.partitions)} partitions, continuing after PIDM {checkpoint.last_pidm}")
+        elif partition_size > 0:
+            checkpoint = ExtractCheckpoint.start(checkpoint_dir, filename, selection, partition_size)
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"Checkpoint state error in {checkpoint_dir}: {e}")
+        return 1
+    resume_after = checkpoint.last_pidm if checkpoint else None
+
+    # Multicore rendering (0 = render in-process)
+    render_workers = args.render_workers
+    if render_workers is None:
+        render_workers = int(delivery_conf.get("render_workers", "0").strip('"').strip() or 0)
+    if render_workers > 0:
+        logging.info(f"Rendering XML in {render_workers} worker processes")
+    xml_path = os.path.join(local_dir, f"{filename}.xml")
+    zip_path = os.path.join(local_dir, f"{filename}.zip")
+
+    # Content-addressed archive: identical XML from earlier runs is not stored again
+    archive = ArchiveStore(os.path.join(local_dir, "archive"))
+
+    # The ZIP is streamed to the network share while it is written
+    network_zip_path = os.path.join(args.network_dir, os.path.basename(zip_path)) if args.network_dir else None
+    copy_paths = [("Network delivery", network_zip_path)] if network_zip_path else []
+
+    # Connect to Oracle and stream XML through the pipeline
+    with monitored_run(args, delivery_conf, db_adapter, local_dir, "alma", run_mode(args, pidms, render_workers)) as (monitor, recorder):
+        try:
+            conn, address_dict, email_dict, phone_dict = connect_and_preload(db_adapter, monitor, resume_after)
+            with monitor.stage("extract"):
+                student_count, delivered, xml_sha256 = extract_to_zip(conn, xml_path, zip_path, copy_paths, address_dict, email_dict, phone_dict, pidms, trace, checkpoint, render_workers)
+            conn.close()
+            with monitor.stage("archive"):
+                archived = archive_deliverable(archive, xml_path, zip_path, xml_sha256)
+            recorder.add(rows=student_count, bytes=os.path.getsize(xml_path))
+            # The run only succeeded once the XML is archived and every copy is delivered
+            complete = archived and all(path in delivered for _, path in copy_paths)
+            recorder.status = "ok" if complete else "failed"
+            logging.info(f"Fetched {student_count} students")
+            logging.info(f"XML written to {xml_path}")
+            logging.info(f"Zipped to {zip_path}")
+        except MemoryBudgetExceeded as e:
+            logging.error(f"Aborted: {e}")
+            recorder.status = "aborted"
+            log_resume_hint(checkpoint)
+            return 1
+        except PipelineError as e:
+            if isinstance(e.error, CheckpointError):
+                logging.error(f"{e.error}; rerun without --resume to start over")
+            else:
+                logging.error(f"Oracle or XML error: {e}")
+                log_resume_hint(checkpoint)
+            return 1
+        except Exception as e:
+            logging.error(f"Oracle or XML error: {e}")
+            log_resume_hint(checkpoint)
+            return 1
+    monitor.log_summary()
+
+    # Keep the checkpoint until every copy is delivered, so --resume can redeliver without re-rendering
+    if checkpoint:
+        if complete:
+            checkpoint.clear()
+        else:
+            log_resume_hint(checkpoint)
+
+    if not network_zip_path:
+        logging.info("No network_dir provided. Skipping delivery.")
+    elif network_zip_path in delivered:
+        logging.info(f"Delivered to {network_zip_path}")
+    else:
+        logging.error(f"Delivery to {network_zip_path} failed")
+
+    # Expire archive entries past retention and remove blobs no longer referenced
+    archive.prune(configured_retention_days(delivery_conf))
+
+    # Clean up old files from local directory
+    cleanup_old_files(local_dir, days=7)
+    return 0 if complete else 1
+
+# -------------------------------
+# Entry point
+# -------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
+
@@ -0,0 +1,155 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+
+# -------------------------------
+# Checkpoint/resume for full ALMA extracts.
+# Rendered <user> XML is saved in partition chunk files of about
+# partition_size students, in PIDM order. The state file lists every
+# completed partition with its last PIDM, so a --resume run replays the
+# saved chunks and only fetches and renders students after that PIDM.
+# -------------------------------
+
+STATE_FILE = "alma_checkpoint.json"
+
+# Bytes read per replayed chunk
+READ_SIZE = 1024 * 1024
+
+class CheckpointError(Exception):
+    pass
+
+class ExtractCheckpoint:
+    def __init__(self, state_dir, state):
+        self.state_dir = state_dir
+        self.state = state
+        self.chunk_dir = os.path.join(state_dir, state["run_name"])
+        self._part = None
+        self._part_digest = None
+        self._part_students = 0
+        self._part_bytes = 0
+        self._part_last_pidm = None
+
+    # -------------------------------
+    # Start a new checkpointed run, discarding any previous state
+    # -------------------------------
+    @classmethod
+    def start(cls, state_dir, run_name, selection, partition_size):
+        previous = cls.load(state_dir)
+        if previous:
+            logging.warning(f"Discarding incomplete checkpoint of run {previous.run_name} "
+                            f"({previous.students_done} students); use --resume to continue it")
+            previous.clear()
+        checkpoint = cls(state_dir, {
+            "run_name": run_name,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "selection": selection,
+            "partition_size": partition_size,
+            "partitions": []
+        })
+        os.makedirs(checkpoint.chunk_dir, exist_ok=True)
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, state_dir):
+        state_path = os.path.join(state_dir, STATE_FILE)
+        if not os.path.exists(state_path):
+            return None
+        with open(state_path, "r", encoding="utf-8") as f:
+            return cls(state_dir, json.load(f))
+
+    @property
+    def run_name(self):
+        return self.state["run_name"]
+
+    @property
+    def partitions(self):
+        return self.state["partitions"]
+
+    @property
+    def students_done(self):
+        return sum(part["students"] for part in self.partitions)
+
+    @property
+    def last_pidm(self):
+        return self.partitions[-1]["last_pidm"] if self.partitions else None
+
+    def save(self):
+        # Write-then-rename, so a crash never leaves a truncated state file
+        state_path = os.path.join(self.state_dir, STATE_FILE)
+        with open(f"{state_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(f"{state_path}.tmp", state_path)
+
+    def clear(self):
+        shutil.rmtree(self.chunk_dir, ignore_errors=True)
+        state_path = os.path.join(self.state_dir, STATE_FILE)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+    # -------------------------------
+    # Replay completed partitions, verifying each against its recorded hash
+    # -------------------------------
+    def replay(self):
+        for part in self.partitions:
+            path = os.path.join(self.chunk_dir, part["file"])
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with open(path, "rb") as f:
+                    for data in iter(lambda: f.read(READ_SIZE), b""):
+                        digest.update(data)
+                        size += len(data)
+                        yield data
+            except OSError as e:
+                raise CheckpointError(f"Checkpoint chunk {path} unreadable: {e}")
+            if size != part["bytes"] or digest.hexdigest() != part["sha256"]:
+                raise CheckpointError(f"Checkpoint chunk {path} does not match the state file")
+
+    # -------------------------------
+    # Append one rendered batch; commits the partition once it is full
+    # -------------------------------
+    def add(self, chunk, students, last_pidm):
+        if not students:
+            return
+        if self._part is None:
+            index = len(self.partitions) + 1
+            self._part_name = f"part-{index:05d}.xml"
+            self._part = open(os.path.join(self.chunk_dir, f"{self._part_name}.part"), "wb")
+            self._part_digest = hashlib.sha256()
+        self._part.write(chunk)
+        self._part_digest.update(chunk)
+        self._part_students += students
+        self._part_bytes += len(chunk)
+        self._part_last_pidm = last_pidm
+        if self._part_students >= self.state["partition_size"]:
+            self.commit()
+
+    def commit(self):
+        if self._part is None:
+            return
+        self._part.close()
+        path = os.path.join(self.chunk_dir, self._part_name)
+        os.replace(f"{path}.part", path)
+        self.partitions.append({
+            "file": self._part_name,
+            "students": self._part_students,
+            "last_pidm": self._part_last_pidm,
+            "bytes": self._part_bytes,
+            "sha256": self._part_digest.hexdigest()
+        })
+        self.save()
+        logging.info(f"Checkpoint: partition {len(self.partitions)} complete, {self.students_done} students "
+                     f"up to PIDM {self._part_last_pidm}")
+        self._part = None
+        self._part_students = self._part_bytes = 0
+
+    def abandon(self):
+        # Drop the open, incomplete partition; completed ones stay resumable
+        if self._part is not None:
+            self._part.close()
+            os.remove(self._part.name)
+            self._part = None
@@ -0,0 +1,142 @@
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, unquote
+from lxml import etree
+
+# -------------------------------
+# Local stand-in for the Alma Users REST API (GET/POST/PUT /almaws/v1/users).
+# Users are kept in memory. Requests above the per-second threshold get 429,
+# and a configurable share of requests fails with 503, so the delivery
+# client's rate limiting and retries can be tested without Alma.
+# -------------------------------
+
+USERS_PATH = "/almaws/v1/users"
+
+ERROR_BODY = ("<web_service_result><errorsExist>true</errorsExist><errorList><error>"
+              "<errorCode>{code}</errorCode><errorMessage>{message}</errorMessage>"
+              "</error></errorList></web_service_result>")
+
+class AlmaStandin:
+    def __init__(self, threshold=25, error_rate=0.0, latency_ms=0, seed=42):
+        self.threshold = threshold
+        self.error_rate = error_rate
+        self.latency = latency_ms / 1000
+        self.rng = random.Random(seed)
+        self.users = {}
+        self.stats = Counter()
+        self.lock = threading.Lock()
+        self.window = (0, 0)  # (second, requests in that second)
+
+    def admit(self):
+        # Returns the status to fail with, or None to serve the request
+        with self.lock:
+            second = int(time.monotonic())
+            count = self.window[1] + 1 if self.window[0] == second else 1
+            self.window = (second, count)
+            if count > self.threshold:
+                self.stats["429"] += 1
+                return 429
+            if self.rng.random() < self.error_rate:
+                self.stats["503"] += 1
+                return 503
+        return None
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as the delivery client expects
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body):
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_request(self, method):
+        standin = self.server.standin
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if standin.latency:
+            time.sleep(standin.latency)
+        with standin.lock:
+            standin.stats[method] += 1
+        failure = standin.admit()
+        if failure == 429:
+            return self.send(429, ERROR_BODY.format(code="PER_SECOND_THRESHOLD", message="Per second threshold exceeded"))
+        if failure:
+            return self.send(failure, ERROR_BODY.format(code="SERVICE_UNAVAILABLE", message="Temporarily unavailable"))
+
+        path = urlsplit(self.path).path
+        if not path.startswith(USERS_PATH):
+            return self.send(404, ERROR_BODY.format(code="404", message="Unknown path"))
+        user_id = unquote(path[len(USERS_PATH):].strip("/")) or None
+        with standin.lock:
+            exists = user_id in standin.users
+        if method == "GET" and user_id:
+            if not exists:
+                return self.send(400, ERROR_BODY.format(code="401861", message=f"User with identifier {user_id} was not found."))
+            return self.send(200, standin.users[user_id])
+        if method == "POST" and not user_id:
+            try:
+                primary_id = etree.fromstring(body).findtext("primary_id")
+            except etree.XMLSyntaxError as e:
+                return self.send(400, ERROR_BODY.format(code="401666", message=f"Invalid user XML: {e}"))
+            with standin.lock:
+                if primary_id in standin.users:
+                    return self.send(400, ERROR_BODY.format(code="401858", message="User with identifier already exists"))
+                standin.users[primary_id] = body
+                standin.stats["created"] += 1
+            return self.send(200, body)
+        if method == "PUT" and user_id:
+            if not exists:
+                return self.send(400, ERROR_BODY.format(code="401861", message=f"User with identifier {user_id} was not found."))
+            with standin.lock:
+                standin.users[user_id] = body
+                standin.stats["updated"] += 1
+            return self.send(200, body)
+        return self.send(400, ERROR_BODY.format(code="400", message=f"Unsupported {method} {path}"))
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+# -------------------------------
+# Start the stand-in on a background thread; returns (server, standin)
+# -------------------------------
+def start_server(port=0, threshold=25, error_rate=0.0, latency_ms=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.standin = AlmaStandin(threshold, error_rate, latency_ms)
+    threading.Thread(target=server.serve_forever, name="alma-api-standin", daemon=True).start()
+    return server, server.standin
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Alma Users REST API")
+    parser.add_argument("--port", type=int, default=8089, help="Port to listen on")
+    parser.add_argument("--threshold", type=int, default=25, help="Requests per second before answering 429")
+    parser.add_argument("--error_rate", type=float, default=0.0, help="Share of requests failing with 503")
+    parser.add_argument("--latency_ms", type=float, default=50, help="Simulated latency per request")
+    args = parser.parse_args()
+
+    server, standin = start_server(args.port, args.threshold, args.error_rate, args.latency_ms)
+    print(f"Alma API stand-in on http://127.0.0.1:{args.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+    print(f"Users: {len(standin.users)}, requests: {dict(standin.stats)}")
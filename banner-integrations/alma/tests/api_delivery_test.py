@@ -0,0 +1,71 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import subprocess
+from collections import Counter
+
+# -------------------------------
+# Resolve base directory of the project
+# -------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(BASE_DIR), "shared"))
+
+import banner_standin
+from alma_api_standin import start_server
+
+DEFAULT_DB = os.path.join(BASE_DIR, "app", "data", "standin", "banner_standin_api.db")
+
+# The stand-in accepts any key, but the job refuses to run without one
+STANDIN_API_KEY = "standin"
+
+def latest_report():
+    reports = glob.glob(os.path.join(BASE_DIR, "app", "data", "api_reports", "*-alma-api.jsonl"))
+    return max(reports, key=os.path.getmtime) if reports else None
+
+# -------------------------------
+# Run the ALMA job against the Alma API stand-in: first pass creates, second updates
+# -------------------------------
+def api_delivery_test(students, db_path, threshold, error_rate, latency_ms, environment):
+    banner_standin.generate(db_path, students)
+    server, standin = start_server(threshold=threshold, error_rate=error_rate, latency_ms=latency_ms)
+    api_url = f"http://127.0.0.1:{server.server_address[1]}"
+    cmd = [sys.executable, os.path.join("src", "alma_extract_main.py"), "--environment", environment,
+           "--sqlite_db", db_path, "--all_students", "--alma_api", "--alma_api_url", api_url]
+
+    expected = [{"created": students}, {"updated": students}]
+    ok = True
+    for run, want in enumerate(expected, 1):
+        start = time.perf_counter()
+        result = subprocess.run(cmd, cwd=BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                env=dict(os.environ, ALMA_API_KEY=STANDIN_API_KEY))
+        wall = time.perf_counter() - start
+        with open(latest_report(), "r", encoding="utf-8") as f:
+            outcomes = Counter(json.loads(line)["action"] for line in f)
+        passed = result.returncode == 0 and dict(outcomes) == want
+        ok = ok and passed
+        print(f"Run {run}: {dict(outcomes)} in {wall:.1f}s ({students * 2 / wall:.1f} requests/s), "
+              f"{'OK' if passed else f'expected {want}'}")
+
+    server.shutdown()
+    print(f"Stand-in: {len(standin.users)} users, requests {dict(standin.stats)}")
+    return 0 if ok and len(standin.users) == students else 1
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test Alma Users API delivery against a local stand-in")
+    parser.add_argument("--students", type=int, default=200, help="Students to generate")
+    parser.add_argument("--sqlite_db", default=DEFAULT_DB, help="Stand-in database (regenerated)")
+    parser.add_argument("--threshold", type=int, default=25, help="Stand-in requests per second before 429")
+    parser.add_argument("--error_rate", type=float, default=0.05, help="Share of stand-in requests failing with 503")
+    parser.add_argument("--latency_ms", type=float, default=50, help="Stand-in latency per request")
+    parser.add_argument("--environment", default="DEV", choices=["DEV", "PREPROD", "PROD"], help="Config section to use")
+    args = parser.parse_args()
+
+    sys.exit(api_delivery_test(args.students, args.sqlite_db, args.threshold, args.error_rate, args.latency_ms,
+                               args.environment))
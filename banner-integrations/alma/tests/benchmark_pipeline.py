@@ -0,0 +1,156 @@
+import os
+import sys
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import logging
+
+# -------------------------------
+# Resolve base directory of the project and import the extract job
+# -------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(BASE_DIR), "shared"))
+
+import alma_extract_main as alma
+from lxml import etree
+
+# -------------------------------
+# Synthetic stand-in for the ALMA views with per-round-trip latency
+# -------------------------------
+STUDENT_COLUMNS = ["SPRIDEN_PIDM", "SPRIDEN_ID", "SPRIDEN_FIRST_NAME", "SPRIDEN_MI", "SPRIDEN_LAST_NAME",
+                   "USER_NAME", "USER_TITLE", "GENDER", "USER_GROUP", "CAMPUS_CODE", "PREFERRED_LANGUAGE",
+                   "USER_BIRTH_DATE", "EXPIRY_DATE", "PURGE_DATE", "BARCODE", "STATUS"]
+ADDRESS_COLUMNS = ["SPRADDR_PIDM", "PREFERRED", "SPRADDR_STREET_LINE1", "SPRADDR_STREET_LINE2", "SPRADDR_STREET_LINE3",
+                   "SPRADDR_CITY", "SPRADDR_STAT_CODE", "SPRADDR_ZIP", "ADDRESS_TYPE", "START_DATE", "END_DATE"]
+EMAIL_COLUMNS = ["EMAIL_PIDM", "PREFERRED", "EMAIL_ADDRESS", "EMAIL_TYPE"]
+PHONE_COLUMNS = ["PHONE_PIDM", "PREFERRED", "PHONE_NUMBER", "PHONE_TYPE"]
+
+def synthetic_tables(students):
+    pidms = range(100000, 100000 + students)
+    return {
+        "ALMA_STUDENT_CHANGED": (STUDENT_COLUMNS, [
+            (p, f"S{p}", "First", "M", f"Last{p}", f"First Last{p}", "Mx", "F", "STUDENT", "MAIN", "en",
+             "2000-01-01", "2030-12-31", "2031-12-31", f"B{p}", "ACTIVE") for p in pidms]),
+        "ALMA_ADDRESS_MA": (ADDRESS_COLUMNS, [
+            (p, "Y" if i == 0 else None, f"{i} Example St", "Unit 1", None, "Sydney", "NSW", "2000", "home",
+             "2020-01-01", None) for p in pidms for i in range(2)]),
+        "ALMA_EMAIL": (EMAIL_COLUMNS, [
+            (p, "Y" if i == 0 else None, f"s{p}.{i}@example.edu.au", "personal") for p in pidms for i in range(2)]),
+        "ALMA_PHONE_HOME": (PHONE_COLUMNS, [(p, "Y", f"04{p:08d}", "home") for p in pidms]),
+    }
+
+class SyntheticCursor:
+    def __init__(self, tables, latency):
+        self.tables = tables
+        self.latency = latency
+        self.arraysize = 100
+        self.description = None
+        self.rows = []
+        self.pos = 0
+
+    def execute(self, query, params=None):
+        table = next(name for name in self.tables if name in query)
+        columns, self.rows = self.tables[table]
+        self.description = [(col,) for col in columns]
+        self.pos = 0
+
+    def fetchmany(self, size=None):
+        time.sleep(self.latency)
+        size = size or self.arraysize
+        rows = self.rows[self.pos:self.pos + size]
+        self.pos += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = []
+        while True:
+            batch = self.fetchmany()
+            if not batch:
+                return rows
+            rows.extend(batch)
+
+    def close(self):
+        pass
+
+class SyntheticConnection:
+    def __init__(self, tables, latency):
+        self.tables = tables
+        self.latency = latency
+
+    def cursor(self):
+        return SyntheticCursor(self.tables, self.latency)
+
+    def close(self):
+        pass
+
+# -------------------------------
+# Previous staged flow, as main() ran it before the pipeline: fetchall() of
+# every student at the driver default arraysize, the whole XML tree built in
+# memory and written, the file rewritten by the XML cleanup, then zipped and
+# the ZIP copied to the archive. Every step materialises its output first.
+# -------------------------------
+STAGED_STUDENT_QUERY = f"SELECT {', '.join(STUDENT_COLUMNS)} FROM ALMA_STUDENT_CHANGED"
+
+def staged_fetch_students(conn):
+    cursor = conn.cursor()
+    cursor.execute(STAGED_STUDENT_QUERY)
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def staged_xml_cleanup(xml_path):
+    with open(xml_path, "r", encoding="utf-8") as f:
+        xml_content = f.read()
+    xml_content = xml_content.replace("<?xml version='1.0' encoding='UTF-8'?>", "")
+    with open(xml_path, "w", encoding="utf-8") as f:
+        f.write(xml_content)
+
+def run_staged(conn, work_dir, dicts):
+    xml_path = os.path.join(work_dir, "staged.xml")
+    zip_path = os.path.join(work_dir, "staged.zip")
+    students = staged_fetch_students(conn)
+    etree.ElementTree(alma.build_xml(students, *dicts)).write(xml_path, encoding="utf-8", xml_declaration=False, pretty_print=True)
+    staged_xml_cleanup(xml_path)
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+        zipf.write(xml_path, arcname=os.path.basename(xml_path))
+    shutil.copy2(zip_path, os.path.join(work_dir, "archive-staged.zip"))
+    return xml_path
+
+def run_pipelined(conn, work_dir, dicts):
+    xml_path = os.path.join(work_dir, "pipelined.xml")
+    zip_path = os.path.join(work_dir, "pipelined.zip")
+    alma.extract_to_zip(conn, xml_path, zip_path, [("Archiving", os.path.join(work_dir, "archive-pipelined.zip"))], *dicts)
+    return xml_path
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark staged vs pipelined ALMA extract on synthetic data")
+    parser.add_argument("--students", type=int, default=200000, help="Number of synthetic students")
+    parser.add_argument("--latency_ms", type=float, default=5.0, help="Simulated latency per fetch round trip")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    tables = synthetic_tables(args.students)
+    conn = SyntheticConnection(tables, args.latency_ms / 1000)
+    dicts = (alma.preload_addresses(conn), alma.preload_emails(conn), alma.preload_phones(conn))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        start = time.perf_counter()
+        staged_xml = run_staged(conn, work_dir, dicts)
+        staged = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pipelined_xml = run_pipelined(conn, work_dir, dicts)
+        pipelined = time.perf_counter() - start
+
+        with open(staged_xml, "rb") as a, open(pipelined_xml, "rb") as b:
+            identical = a.read() == b.read()
+
+    print(f"Students: {args.students}, fetch latency: {args.latency_ms}ms per round trip")
+    print(f"Staged:    {staged:.2f}s")
+    print(f"Pipelined: {pipelined:.2f}s")
+    print(f"Speedup:   {staged / pipelined:.2f}x, identical XML: {identical}")
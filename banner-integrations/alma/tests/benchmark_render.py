@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import argparse
+import logging
+
+# -------------------------------
+# Resolve base directory of the project and import the extract job
+# -------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(BASE_DIR), "shared"))
+
+import alma_extract_main as alma
+from benchmark_pipeline import synthetic_tables, SyntheticConnection
+
+# -------------------------------
+# Render all students in-process (0) or with a pool of N workers;
+# returns the rendered bytes and the rendering time in seconds
+# -------------------------------
+def render_all(batches, dicts, workers):
+    if workers == 0:
+        start = time.perf_counter()
+        output = b"".join(chunk for _, chunk in alma.rendered_batches(batches, *dicts))
+        return output, time.perf_counter() - start
+    with alma.open_render_pool(workers) as pool:
+        # Start the workers before timing, as a long run amortises their start-up
+        pool.submit(len, []).result()
+        start = time.perf_counter()
+        output = b"".join(chunk for _, chunk in alma.rendered_batches(batches, *dicts, pool=pool, workers=workers))
+        return output, time.perf_counter() - start
+
+def worker_counts(max_workers):
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    return counts
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark in-process vs multicore ALMA XML rendering on synthetic data")
+    parser.add_argument("--students", type=int, default=100000, help="Number of synthetic students")
+    parser.add_argument("--max_workers", type=int, default=os.cpu_count(), help="Largest worker count to try")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    conn = SyntheticConnection(synthetic_tables(args.students), 0)
+    dicts = (alma.preload_addresses(conn), alma.preload_emails(conn), alma.preload_phones(conn))
+    batches = list(alma.fetch_student_batches(conn, pidms=None))
+
+    expected, serial = render_all(batches, dicts, 0)
+    print(f"Students: {args.students}, CPU cores: {os.cpu_count()}")
+    print(f"In-process: {serial:.2f}s")
+
+    for workers in worker_counts(args.max_workers):
+        output, elapsed = render_all(batches, dicts, workers)
+        print(f"{workers:>3} workers: {elapsed:.2f}s, speedup {serial / elapsed:.2f}x, identical: {output == expected}")
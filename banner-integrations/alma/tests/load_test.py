@@ -0,0 +1,29 @@
+import os
+import sys
+import argparse
+
+# -------------------------------
+# Resolve base directory of the project
+# -------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(BASE_DIR), "shared"))
+
+from load_harness import add_standin_arguments, ensure_standin, run_job
+
+# -------------------------------
+# Full ALMA run against the SQLite stand-in
+# -------------------------------
+def load_test(students, db_path, regenerate, environment):
+    ensure_standin(db_path, students, regenerate)
+    return run_job("ALMA", BASE_DIR, "alma_extract_main.py", environment, db_path, ["--all_students"])
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the ALMA extract against a SQLite Banner stand-in")
+    add_standin_arguments(parser, BASE_DIR)
+    args = parser.parse_args()
+
+    sys.exit(load_test(args.students, args.sqlite_db, args.regenerate, args.environment))
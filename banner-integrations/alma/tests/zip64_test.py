@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import zipfile
+
+# -------------------------------
+# Resolve base directory of the project
+# -------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(BASE_DIR), "shared"))
+
+from pipeline import compress_chunks, compress_stream, CHUNK_SIZE
+
+# -------------------------------
+# Streams one ZIP entry past zipfile.ZIP64_LIMIT (2 GiB) through both
+# compression paths and reads it back: compress_chunks (the ALMA pipeline,
+# non-seekable output) from synthetic chunks, and compress_stream (OPAL and
+# the archive) from a sparse file. Without ZIP64 the write fails at the limit.
+# -------------------------------
+
+# Default entry size: just past the ZIP64 limit
+DEFAULT_SIZE_MB = zipfile.ZIP64_LIMIT // CHUNK_SIZE + 16
+
+ARCNAME = "student.xml"
+
+def synthetic_chunks(size):
+    # Repeated <user> records, CHUNK_SIZE bytes at a time
+    record = b"<user><primary_id>S00000000</primary_id><status>ACTIVE</status></user>\n"
+    block = (record * (CHUNK_SIZE // len(record) + 1))[:CHUNK_SIZE]
+    remaining = size
+    while remaining > 0:
+        yield block[:remaining]
+        remaining -= len(block)
+
+def check_entry(zip_path, size):
+    # Reading to the end verifies the CRC; returns an error message or None
+    with zipfile.ZipFile(zip_path) as zipf:
+        info = zipf.getinfo(ARCNAME)
+        if info.file_size != size:
+            return f"entry size {info.file_size}, expected {size}"
+        read = 0
+        with zipf.open(info) as entry:
+            while True:
+                data = entry.read(CHUNK_SIZE)
+                if not data:
+                    break
+                read += len(data)
+    return None if read == size else f"read {read} bytes, expected {size}"
+
+def run_case(name, produce, zip_path, size):
+    start = time.perf_counter()
+    try:
+        produce()
+        error = check_entry(zip_path, size)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    print(f"{name}: {'FAIL, ' + error if error else 'OK'} ({os.path.getsize(zip_path) if os.path.exists(zip_path) else 0} "
+          f"bytes zipped, {time.perf_counter() - start:.1f}s)")
+    return error is None
+
+def zip64_test(size_mb, work_dir):
+    size = size_mb * CHUNK_SIZE
+    print(f"Entry size: {size} bytes (ZIP64 limit {zipfile.ZIP64_LIMIT})")
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp:
+        chunks_zip = os.path.join(tmp, "chunks.zip")
+
+        def from_chunks():
+            with open(chunks_zip, "wb") as dst:
+                for data in compress_chunks(synthetic_chunks(size), "zip", ARCNAME):
+                    dst.write(data)
+
+        ok = run_case("compress_chunks (synthetic source)", from_chunks, chunks_zip, size)
+        os.remove(chunks_zip)
+
+        sparse_path = os.path.join(tmp, ARCNAME)
+        with open(sparse_path, "wb") as fh:
+            fh.truncate(size)
+        stream_zip = os.path.join(tmp, "stream.zip")
+
+        def from_file():
+            with open(sparse_path, "rb") as src, open(stream_zip, "wb") as dst:
+                compress_stream(src, dst, "zip", ARCNAME)
+
+        ok = run_case("compress_stream (sparse file)", from_file, stream_zip, size) and ok
+    return 0 if ok else 1
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a ZIP entry past the ZIP64 limit through the pipeline")
+    parser.add_argument("--size_mb", type=int, default=DEFAULT_SIZE_MB, help="Uncompressed entry size in MiB")
+    parser.add_argument("--work_dir", default=None, help="Directory for the temporary files (a few MB of zip output)")
+    args = parser.parse_args()
+
+    sys.exit(zip64_test(args.size_mb, args.work_dir))
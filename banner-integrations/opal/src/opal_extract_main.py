@@ -1,219 +1,627 @@
-import os
-import argparse
-import configparser
-import cx_Oracle
-import paramiko
-import logging
-from logging.handlers import RotatingFileHandler
-from datetime import datetime, timedelta
-import shutil
-import time
-
-# -------------------------------
-# Resolve base directory of the project
-# -------------------------------
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-
-# -------------------------------
-# Initialize Oracle Client for Thick mode (only outside Docker)
-# -------------------------------
-running_in_docker = os.getenv("RUNNING_IN_DOCKER", "true").lower()
- 
-if running_in_docker != "true":
-
-# if os.getenv("RUNNING_IN_DOCKER") != "true":
-    instant_client_dir = r"C:\\oracle\\instantclient_21_19"
-    cx_Oracle.init_oracle_client(lib_dir=instant_client_dir)
-
-# -------------------------------
-# Load configuration from config.ini
-# -------------------------------
-def get_config():
-    config_path = os.path.join(BASE_DIR, "src", "config.ini")
-    config = configparser.ConfigParser()
-    config.read(config_path)
-    return config
-
-# -------------------------------
-# Parse command-line arguments
-# -------------------------------
-def parse_args():
-    parser = argparse.ArgumentParser(description="OPAL Extract Script")
-    parser.add_argument("--environment", required=True, choices=["DEV", "PREPROD", "PROD"], help="Target environment")
-    parser.add_argument("--sftp_host")
-    parser.add_argument("--sftp_port", type=int)
-    parser.add_argument("--sftp_username")
-    parser.add_argument("--sftp_private_key")
-    parser.add_argument("--sftp_remote_dir")
-    return parser.parse_args()
-
-# -------------------------------
-# Remove files older than a specified number of days
-# -------------------------------
-def cleanup_old_files(folder_path, days=7):
-    cutoff_time = time.time() - (days * 86400)
-    for file_name in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file_name)
-        if os.path.isfile(file_path) and os.path.getmtime(file_path) < cutoff_time:
-            os.remove(file_path)
-
-# -------------------------------
-# Set up logging: console + rotating file handler
-# -------------------------------
-def setup_logging(log_dir):
-    os.makedirs(log_dir, exist_ok=True)
-    log_file = os.path.join(log_dir, "opal_oracle_export.log")
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s %(levelname)s %(message)s",
-        handlers=[
-            logging.StreamHandler(),
-            RotatingFileHandler(log_file, maxBytes=5*1024*1024, backupCount=3, encoding="utf-8")
-        ]
-    )
-
-# -------------------------------
-# Establish Oracle database connection using provided configuration
-# -------------------------------
-def get_oracle_connection(db_conf):
-    try:
-        dsn = cx_Oracle.makedsn(db_conf["db_url"], db_conf["db_port"], service_name=db_conf["db_name"])
-        conn = cx_Oracle.connect(
-            user=db_conf["db_username"],
-            password=db_conf["db_password"],
-            dsn=dsn
-        )
-        return conn
-    except Exception as e:
-        logging.error(f"Oracle connection failed: {e}")
-        raise
-
-# -------------------------------
-# Fetch source data
-# -------------------------------
-def fetch_sftp_lines(conn):
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT SFTP_LINE FROM ACU.SZBSFTP3 WHERE LINE_NO = 0")
-        header_lines = [row[0] for row in cursor.fetchall()]
-        cursor.execute("SELECT SFTP_LINE FROM ACU.SZBSFTP3 WHERE LINE_NO = 1")
-        body_lines = [row[0] for row in cursor.fetchall()]
-        cursor.close()
-        return header_lines + body_lines
-    except Exception as e:
-        logging.error(f"Oracle fetch failed: {e}")
-        raise
-
-def fetch_file_name(conn):
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT FILE_NAME FROM ACU.SZBSFTP0 WHERE FILE_TYPE = 'put'")
-        result = cursor.fetchone()
-        cursor.close()
-        return result[0] if result else None
-    except Exception as e:
-        logging.error(f"Oracle file name fetch failed: {e}")
-        raise
-
-# -------------------------------
-# Write extracted lines to a flat file
-# -------------------------------
-def write_flat_file(lines, file_path):
-    try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            for line in lines:
-                f.write(f"{line}\n")
-        logging.info(f"Wrote flat file: {file_path}")
-    except Exception as e:
-        logging.error(f"File write failed: {e}")
-        raise
-
-# -------------------------------
-# Archive a file by copying it to the specified directory
-# -------------------------------
-def archive_file(file_path, archive_dir):
-    try:
-        os.makedirs(archive_dir, exist_ok=True)
-        archive_path = os.path.join(archive_dir, os.path.basename(file_path))
-        shutil.copy2(file_path, archive_path)
-        logging.info(f"Archived {file_path} to {archive_path}")
-    except Exception as e:
-        logging.error(f"Archiving failed: {e}")
-
-# -------------------------------
-# Upload a local file to a remote SFTP server 
-# -------------------------------
-def sftp_transfer(sftp_args, local_file, remote_file):
-    try:
-        key = paramiko.RSAKey.from_private_key_file(sftp_args["private_key"])
-        transport = paramiko.Transport((sftp_args["host"], int(sftp_args["port"])))
-        transport.connect(username=sftp_args["username"], pkey=key)
-        sftp = paramiko.SFTPClient.from_transport(transport)
-        remote_path = os.path.join(sftp_args["remote_dir"], remote_file)
-        sftp.put(local_file, remote_path)
-        sftp.close()
-        transport.close()
-        logging.info(f"Transferred {local_file} to SFTP {remote_path}")
-    except Exception as e:
-        logging.error(f"SFTP transfer failed: {e}")
-
-# -------------------------------
-# Main execution function
-# -------------------------------
-def main():
-    # Parse arguments and load config
-    args = parse_args()
-    config = get_config()
-    db_conf = config[args.environment]
-    delivery_conf = config["delivery"]
-
-    # Resolve local and log directories
-    local_dir = delivery_conf.get("local_dir", "app/data").replace('"', '')
-    log_dir = delivery_conf.get("log_dir", "app/log").replace('"', '')
-    archive_dir = os.path.join(local_dir, "archive")
-    setup_logging(log_dir)
-    os.makedirs(local_dir, exist_ok=True)
-
-    try:
-        conn = get_oracle_connection(db_conf)
-        file_ext = delivery_conf['file_ext'].strip('"').strip()
-        file_name = fetch_file_name(conn)
-
-        if not file_name:
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            file_name = f"{delivery_conf['filename_prefix']}_{timestamp}{file_ext}"
-        elif not file_name.endswith(file_ext):
-            file_name = f"{file_name}{file_ext}"
-
-        flat_file_path = os.path.join(local_dir, file_name)
-        lines = fetch_sftp_lines(conn)
-        conn.close()
-
-        # Write the local flat file
-        write_flat_file(lines, flat_file_path)
-
-        # Archive the local flat file
-        archive_file(flat_file_path, archive_dir)
-
-        # Only upload to SFTP if all SFTP parameters are provided
-        sftp_params = {
-            "host": args.sftp_host,
-            "port": args.sftp_port,
-            "username": args.sftp_username,
-            "private_key": args.sftp_private_key,
-            "remote_dir": args.sftp_remote_dir
-        }
-        if all(sftp_params.values()):
-            sftp_transfer(sftp_params, flat_file_path, file_name)
-        else:
-            logging.info("SFTP parameters not supplied, skipping upload.")
-
-        logging.info("Process complete.")
-    except Exception as e:
-        logging.error(f"Fatal error: {e}", exc_info=True)
-
-    # Clean up old files from local directory
-    cleanup_old_files(local_dir, days=7)
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import os
+import sys
+import argparse
+import configparser
+import paramiko
+import logging
+from datetime import datetime, timedelta
+import time
+import re
+import hashlib
+import json
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack, nullcontext
+
+# -------------------------------
+# Modules shared by the ALMA and OPAL jobs live in banner-integrations/shared
+# -------------------------------
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "shared"))
+
+from pipeline import (Stage, run_pipeline, fetch_batches, write_through, write_all, compress_chunks,
+                      compress_stream, compressed_name, CountingWriter, CancellableReader, PipelineCancelled,
+                      raise_if_cancelled, COMPRESSION_SUFFIXES, POLL_SECONDS)
+from db_adapter import get_db_adapter
+from run_history import RunRecorder, history_path
+from archive_store import ArchiveStore, configured_retention_days
+from stage_monitor import StageMonitor, MemoryBudgetExceeded, resolve_max_memory_mb
+from queue_logging import start_queue_logging
+
+# -------------------------------
+# Resolve base directory of the project
+# -------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+
+# Rows fetched per Oracle round trip when streaming the extract
+FETCH_ARRAYSIZE = 5000
+
+# Default number of files generated and uploaded in parallel, when SZBSFTP3 lines are keyed by file
+DEFAULT_MAX_WORKERS = 4
+
+# Pattern a configured SZBSFTP3 column name must match, as it is placed in the query text
+COLUMN_NAME_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9_$#]*$")
+
+# Flat file extension when config.ini does not set file_ext
+DEFAULT_FILE_EXT = ".dat"
+
+# -------------------------------
+# Load configuration from config.ini
+# -------------------------------
+def get_config():
+    config_path = os.path.join(BASE_DIR, "src", "config.ini")
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return config
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+def parse_args():
+    parser = argparse.ArgumentParser(description="OPAL Extract Script")
+    parser.add_argument("--environment", required=True, choices=["DEV", "PREPROD", "PROD"], help="Target environment")
+    parser.add_argument("--sftp_host")
+    parser.add_argument("--sftp_port", type=int)
+    parser.add_argument("--sftp_username")
+    parser.add_argument("--sftp_private_key")
+    parser.add_argument("--sftp_remote_dir")
+    parser.add_argument("--sftp_compress", choices=sorted(COMPRESSION_SUFFIXES), help="Optional on-the-fly compression for upload and archive")
+    parser.add_argument("--single_pass", action="store_true", help="Stream rows once to the local file, archive and SFTP at the same time")
+    parser.add_argument("--force_delivery", action="store_true", help="Archive and upload even if the content matches the last delivery")
+    parser.add_argument("--sqlite_db", help="Read from a SQLite stand-in of the Banner views instead of Oracle")
+    parser.add_argument("--max_workers", type=int, help="Files generated and uploaded in parallel when several are queued "
+                        f"(default {DEFAULT_MAX_WORKERS}; needs sftp_lines_file_column in config.ini)")
+    parser.add_argument("--max_memory_mb", type=int, help="Abort if RSS exceeds this many MB (overrides config.ini, 0 = unlimited)")
+    parser.add_argument("--trace_memory", action="store_true", help="Also report traced Python allocations per stage (slower)")
+    return parser.parse_args()
+
+# -------------------------------
+# Remove files older than a specified number of days
+# -------------------------------
+def cleanup_old_files(folder_path, days=7):
+    cutoff_time = time.time() - (days * 86400)
+    for file_name in os.listdir(folder_path):
+        file_path = os.path.join(folder_path, file_name)
+        if os.path.isfile(file_path) and os.path.getmtime(file_path) < cutoff_time:
+            os.remove(file_path)
+
+# -------------------------------
+# Set up logging: console + rotating file handler, written by a background listener
+# -------------------------------
+def setup_logging(log_dir):
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, "opal_oracle_export.log")
+    return start_queue_logging(log_file)
+
+# -------------------------------
+# Establish a database connection through the configured adapter
+# -------------------------------
+def get_db_connection(db_adapter):
+    try:
+        return db_adapter.connect()
+    except Exception as e:
+        logging.error(f"Oracle connection failed ({db_adapter.describe()}): {e}")
+        raise
+
+# -------------------------------
+# Fetch source data
+# -------------------------------
+def sftp_lines_file_column(delivery_conf):
+    # SZBSFTP3 column holding the SZBSFTP0 FILE_NAME of each line, or None when
+    # SZBSFTP3 only holds the lines of the file being sent (the Banner default)
+    column = delivery_conf.get("sftp_lines_file_column", "").strip('"').strip()
+    if column and not COLUMN_NAME_PATTERN.match(column):
+        raise ValueError(f"Invalid sftp_lines_file_column in config.ini: {column!r}")
+    return column or None
+
+def sftp_lines_query(lines_filter=None):
+    # lines_filter: (column, file name) selecting one file's lines; the query only depends on the configuration
+    if lines_filter:
+        return f"SELECT SFTP_LINE FROM ACU.SZBSFTP3 WHERE LINE_NO = :1 AND {lines_filter[0]} = :2"
+    return "SELECT SFTP_LINE FROM ACU.SZBSFTP3 WHERE LINE_NO = :1"
+
+def sftp_lines_params(line_no, lines_filter=None):
+    return [line_no, lines_filter[1]] if lines_filter else [line_no]
+
+def fetch_sftp_line_batches(conn, lines_filter=None, arraysize=FETCH_ARRAYSIZE):
+    # Header lines (LINE_NO 0) then body lines (LINE_NO 1), one round trip per batch
+    try:
+        cursor = conn.cursor()
+        for line_no in (0, 1):
+            cursor.execute(sftp_lines_query(lines_filter), sftp_lines_params(line_no, lines_filter))
+            for rows in fetch_batches(cursor, arraysize):
+                yield [row[0] for row in rows]
+        cursor.close()
+    except Exception as e:
+        logging.error(f"Oracle fetch failed: {e}")
+        raise
+
+def fetch_file_names(conn):
+    # Every pending 'put' file, in queue order and without duplicates
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT FILE_NAME FROM ACU.SZBSFTP0 WHERE FILE_TYPE = 'put'")
+        file_names = []
+        for (file_name,) in cursor.fetchall():
+            if file_name and file_name not in file_names:
+                file_names.append(file_name)
+        cursor.close()
+        return file_names
+    except Exception as e:
+        logging.error(f"Oracle file name fetch failed: {e}")
+        raise
+
+# -------------------------------
+# Render extracted lines as flat file bytes, hashing and counting the content as it passes
+# -------------------------------
+def render_flat_file(batches, digest, counts):
+    for lines in batches:
+        chunk = "".join(f"{line}{os.linesep}" for line in lines).encode("utf-8")
+        digest.update(chunk)
+        counts["lines"] += len(lines)
+        yield chunk
+
+def extract_stages(conn, lines_filter, digest, counts):
+    return [
+        Stage("fetch", lambda: fetch_sftp_line_batches(conn, lines_filter)),
+        Stage("render", lambda batches: render_flat_file(batches, digest, counts)),
+    ]
+
+# -------------------------------
+# Write extracted lines to a flat file
+# -------------------------------
+def write_flat_file(conn, file_path, lines_filter=None, counts=None, cancel=None):
+    # Returns the SHA-256 and size of the content, computed while writing; counts["lines"] gets the line count
+    counts = Counter() if counts is None else counts
+    try:
+        digest = hashlib.sha256()
+        with open(file_path, "wb") as f:
+            raw_bytes = sum(run_pipeline(extract_stages(conn, lines_filter, digest, counts) + [
+                Stage("write", lambda chunks: write_all(chunks, f)),
+            ], cancel=cancel))
+        logging.info(f"Wrote flat file: {file_path}")
+        return digest.hexdigest(), raw_bytes
+    except PipelineCancelled:
+        remove_partial_outputs([file_path])
+        raise
+    except Exception as e:
+        logging.error(f"File write failed: {e}")
+        raise
+
+# -------------------------------
+# Archive a file in the content-addressed store; returns its blob path
+# -------------------------------
+def archive_file(file_path, archive, compress=None, content_hash=None):
+    # Identical content archived by an earlier run is only added to the index
+    try:
+        file_name = os.path.basename(file_path)
+        entry, stored = archive.add(file_path, compressed_name(file_name, compress), compress, file_name, content_hash)
+        archive_path = archive.blob_path(entry["sha256"])
+        logging.info(f"Archived {file_path} to {archive_path}{' (content already stored)' if stored else ''}")
+        return archive_path
+    except Exception as e:
+        logging.error(f"Archiving failed: {e}")
+        return None
+
+def archive_blob(blob, file_name, archive, compress=None):
+    # Completes an archive blob written while the file was generated
+    entry, stored = archive.add_blob(blob, compressed_name(file_name, compress), compress, file_name)
+    archive_path = archive.blob_path(entry["sha256"])
+    logging.info(f"Archived {file_name} to {archive_path}{' (content already stored)' if stored else ''}")
+    return archive_path
+
+# -------------------------------
+# Open an authenticated SFTP session
+# -------------------------------
+def open_sftp_transport(sftp_args):
+    key = paramiko.RSAKey.from_private_key_file(sftp_args["private_key"])
+    transport = paramiko.Transport((sftp_args["host"], int(sftp_args["port"])))
+    try:
+        transport.connect(username=sftp_args["username"], pkey=key)
+    except Exception:
+        transport.close()
+        raise
+    return transport
+
+def open_sftp(sftp_args, transport=None):
+    # Opens a new SFTP channel; the returned transport is only set if the caller owns it
+    owned_transport = None
+    if transport is None:
+        transport = owned_transport = open_sftp_transport(sftp_args)
+    try:
+        sftp = paramiko.SFTPClient.from_transport(transport)
+    except Exception:
+        if owned_transport:
+            owned_transport.close()
+        raise
+    return owned_transport, sftp
+
+def log_upload_stats(compress, raw_bytes, wire_bytes, elapsed):
+    ratio = (wire_bytes / raw_bytes * 100) if raw_bytes else 100.0
+    logging.info(f"SFTP upload stats: compression={compress or 'none'}, uncompressed={raw_bytes} bytes, "
+                 f"wire={wire_bytes} bytes ({ratio:.1f}% of uncompressed), elapsed={elapsed:.2f}s")
+
+# -------------------------------
+# Upload a local file to a remote SFTP server 
+# -------------------------------
+def sftp_transfer(sftp_args, local_file, remote_file, compress=None, transport=None, cancel=None):
+    # cancel: the upload stops once it is set; a cancelled or interrupted upload removes its partial remote file
+    owned_transport = sftp = remote_path = None
+    try:
+        start = time.perf_counter()
+        raw_bytes = os.path.getsize(local_file)
+        owned_transport, sftp = open_sftp(sftp_args, transport)
+        remote_path = os.path.join(sftp_args["remote_dir"], compressed_name(remote_file, compress))
+        with open(local_file, "rb") as f:
+            src = CancellableReader(f, cancel) if cancel else f
+            if compress:
+                # Compress while uploading: no second temporary file on disk
+                with sftp.open(remote_path, "wb") as remote:
+                    remote.set_pipelined(True)
+                    wire = CountingWriter(remote)
+                    compress_stream(src, wire, compress, remote_file)
+                wire_bytes = wire.bytes_written
+            else:
+                sftp.putfo(src, remote_path, file_size=raw_bytes)
+                wire_bytes = raw_bytes
+        sftp.close()
+        if owned_transport:
+            owned_transport.close()
+        logging.info(f"Transferred {local_file} to SFTP {remote_path}")
+        log_upload_stats(compress, raw_bytes, wire_bytes, time.perf_counter() - start)
+        return remote_path
+    except (PipelineCancelled, KeyboardInterrupt):
+        # Cancelled with the other deliveries, or interrupted by the memory budget
+        logging.warning(f"SFTP transfer of {local_file} stopped")
+        remove_partial_outputs([], sftp, remote_path)
+        if sftp:
+            sftp.close()
+        if owned_transport:
+            owned_transport.close()
+        raise
+    except Exception as e:
+        logging.error(f"SFTP transfer failed: {e}")
+        return None
+
+# -------------------------------
+# Single pass: stream rows once and tee them to local file, archive and SFTP
+# -------------------------------
+def remove_partial_outputs(local_paths, sftp=None, remote_path=None):
+    for path in local_paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logging.error(f"Could not remove partial file {path}: {e}")
+    if sftp and remote_path:
+        try:
+            sftp.remove(remote_path)
+            logging.info(f"Removed partial SFTP file {remote_path}")
+        except Exception as e:
+            logging.error(f"Could not remove partial SFTP file {remote_path}: {e}")
+
+def single_pass_extract(conn, flat_file_path, archive, sftp_args, remote_file, compress=None,
+                        lines_filter=None, transport=None, counts=None, cancel=None):
+    start = time.perf_counter()
+    counts = Counter() if counts is None else counts
+    owned_transport = sftp = remote_path = wire = blob = None
+    digest = hashlib.sha256()
+    try:
+        with ExitStack() as stack:
+            local = CountingWriter(stack.enter_context(open(flat_file_path, "wb")))
+            stages = extract_stages(conn, lines_filter, digest, counts)
+            # The archive blob is written from the stream, so the file is not read back to archive it
+            blob = archive.open_blob()
+            stages.append(Stage("archive", lambda chunks: write_through(chunks, blob)))
+            if sftp_args:
+                owned_transport, sftp = open_sftp(sftp_args, transport)
+                remote_path = os.path.join(sftp_args["remote_dir"], compressed_name(remote_file, compress))
+                remote_fh = stack.enter_context(sftp.open(remote_path, "wb"))
+                remote_fh.set_pipelined(True)
+                wire = CountingWriter(remote_fh)
+
+                # Compress after the local write; the compressed stream feeds the remote file
+                stages.append(Stage("write", lambda chunks: write_through(chunks, local)))
+                if compress:
+                    stages.append(Stage("compress", lambda chunks: compress_chunks(chunks, compress, remote_file)))
+                stages.append(Stage("deliver", lambda chunks: write_all(chunks, wire)))
+            else:
+                stages.append(Stage("write", lambda chunks: write_all(chunks, local)))
+            run_pipeline(stages, cancel=cancel)
+            raw_bytes = local.bytes_written
+        archive_path = archive_blob(blob, os.path.basename(flat_file_path), archive, compress)
+    except BaseException as e:
+        logging.error(f"Single-pass extract failed, removing partial output: {e!r}")
+        if blob:
+            blob.discard()
+        remove_partial_outputs([flat_file_path], sftp, remote_path)
+        raise
+    finally:
+        if sftp:
+            sftp.close()
+        if owned_transport:
+            owned_transport.close()
+
+    logging.info(f"Wrote flat file: {flat_file_path}")
+    if sftp_args:
+        logging.info(f"Transferred {flat_file_path} to SFTP {remote_path}")
+        log_upload_stats(compress, raw_bytes, wire.bytes_written, time.perf_counter() - start)
+    else:
+        logging.info("SFTP parameters not supplied, skipping upload.")
+    return digest.hexdigest(), raw_bytes, archive_path, remote_path
+
+# -------------------------------
+# Delivery manifest: one JSON line per successful delivery
+# -------------------------------
+MANIFEST_LOCK = threading.Lock()
+
+def sftp_destination(sftp_args):
+    if not sftp_args:
+        return "local"
+    return f"sftp://{sftp_args['username']}@{sftp_args['host']}:{sftp_args['port']}/{sftp_args['remote_dir']}"
+
+def find_last_delivery(manifest_path, delivery_key, destination):
+    last = None
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logging.warning(f"Ignoring malformed manifest line in {manifest_path}")
+                continue
+            if entry.get("delivery_key") == delivery_key and entry.get("destination") == destination:
+                last = entry
+    return last
+
+def same_as_delivery(last_delivery, content_hash, compress):
+    # The last delivery sent the same content, packaged the same way
+    return bool(last_delivery and last_delivery["sha256"] == content_hash
+                and last_delivery.get("compression") == compress)
+
+def record_delivery(manifest_path, entry):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with MANIFEST_LOCK, open(manifest_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+    logging.info(f"Recorded delivery of {entry['file_name']} (sha256 {entry['sha256']}) in {manifest_path}")
+
+# -------------------------------
+# Generate, archive and deliver one file; returns its per-file outcome
+# -------------------------------
+def deliver_file(conn, source_name, file_name, args, delivery_conf, local_dir, archive, manifest_path,
+                 sftp_args, transport=None, file_column=None, monitor=None, recorder=None, cancel=None):
+    # file_column: SZBSFTP3 column selecting this file's lines (see sftp_lines_file_column)
+    # cancel: threading.Event set when the run aborts; raises PipelineCancelled at the next step
+    # monitor: StageMonitor for per-stage memory accounting (main thread only)
+    # recorder: RunRecorder receiving the line count and size of every file generated
+    stage = monitor.stage if monitor else (lambda name: nullcontext())
+    counts = Counter()
+    flat_file_path = os.path.join(local_dir, file_name)
+    lines_filter = (file_column, source_name) if file_column and source_name else None
+
+    # Deliveries are compared per source file name and destination
+    delivery_key = source_name or delivery_conf['filename_prefix'].strip('"')
+    destination = sftp_destination(sftp_args)
+    last_delivery = find_last_delivery(manifest_path, delivery_key, destination)
+
+    if args.single_pass:
+        # Stream once from the cursor to local file, archive and SFTP
+        with stage("single_pass"):
+            content_hash, raw_bytes, archive_path, remote_path = single_pass_extract(
+                conn, flat_file_path, archive, sftp_args, file_name, args.sftp_compress,
+                lines_filter, transport, counts, cancel)
+        if recorder:
+            recorder.add(rows=counts["lines"], bytes=raw_bytes)
+        if sftp_args and same_as_delivery(last_delivery, content_hash, args.sftp_compress):
+            logging.info(f"Content unchanged since delivery at {last_delivery['delivered_at']}; "
+                         f"single-pass mode cannot skip, so it was delivered again.")
+    else:
+        # Write the local flat file
+        with stage("extract"):
+            content_hash, raw_bytes = write_flat_file(conn, flat_file_path, lines_filter, counts, cancel)
+        archive_path = remote_path = None
+        if recorder:
+            recorder.add(rows=counts["lines"], bytes=raw_bytes)
+
+        if same_as_delivery(last_delivery, content_hash, args.sftp_compress) and not args.force_delivery:
+            logging.info(f"Content of {file_name} unchanged since delivery of {last_delivery['file_name']} "
+                         f"at {last_delivery['delivered_at']} (sha256 {content_hash}), skipping archive and upload.")
+            return "skipped"
+
+        # Archive the local flat file
+        raise_if_cancelled(cancel)
+        with stage("archive"):
+            archive_path = archive_file(flat_file_path, archive, args.sftp_compress, content_hash)
+
+        if sftp_args:
+            with stage("upload"):
+                remote_path = sftp_transfer(sftp_args, flat_file_path, file_name, args.sftp_compress, transport, cancel)
+        else:
+            logging.info("SFTP parameters not supplied, skipping upload.")
+
+    # Record only complete deliveries, so a failed run is retried next time
+    if not archive_path or (sftp_args and not remote_path):
+        return "failed"
+    record_delivery(manifest_path, {
+        "delivered_at": datetime.now().isoformat(timespec="seconds"),
+        "delivery_key": delivery_key,
+        "file_name": file_name,
+        "sha256": content_hash,
+        "bytes": raw_bytes,
+        "compression": args.sftp_compress,
+        "destination": destination,
+        "archive_path": archive_path,
+        "remote_path": remote_path
+    })
+    return "delivered"
+
+def deliver_file_worker(db_adapter, *deliver_args, **deliver_kwargs):
+    # Each worker runs on its own Oracle connection
+    file_name = deliver_args[1]
+    try:
+        conn = get_db_connection(db_adapter)
+        try:
+            return file_name, deliver_file(conn, *deliver_args, **deliver_kwargs)
+        finally:
+            conn.close()
+    except PipelineCancelled:
+        logging.warning(f"Delivery of {file_name} cancelled")
+        return file_name, "cancelled"
+    except Exception as e:
+        logging.error(f"Delivery of {file_name} failed: {e}", exc_info=True)
+        return file_name, "failed"
+
+def run_mode(args, sftp_args):
+    # Runs are only compared with runs of the same mode in the run history
+    mode = "single_pass" if args.single_pass else "staged"
+    mode += ", sftp upload" if sftp_args else ", no upload"
+    if args.sftp_compress:
+        mode += f", {args.sftp_compress}"
+    if args.force_delivery and not args.single_pass:
+        mode += ", forced"
+    return mode
+
+# -------------------------------
+# Main execution function
+# -------------------------------
+def main():
+    # Returns the exit status: 0 when every file was delivered or skipped as unchanged, otherwise 1
+    # Parse arguments and load config
+    args = parse_args()
+    config = get_config()
+    db_conf = config[args.environment]
+    delivery_conf = config["delivery"]
+    db_adapter = get_db_adapter(db_conf, args.sqlite_db)
+
+    # Files can only be generated in parallel when SZBSFTP3 lines can be told apart by file
+    try:
+        file_column = sftp_lines_file_column(delivery_conf)
+    except ValueError as e:
+        sys.exit(str(e))
+    if args.max_workers is None:
+        args.max_workers = DEFAULT_MAX_WORKERS if file_column else 1
+    elif args.max_workers > 1 and not file_column:
+        sys.exit("--max_workers > 1 needs sftp_lines_file_column in config.ini: without it ACU.SZBSFTP3 lines "
+                 "cannot be attributed to a queued file, so only one file is delivered per run.")
+
+    # Resolve local and log directories
+    local_dir = delivery_conf.get("local_dir", "app/data").replace('"', '')
+    log_dir = delivery_conf.get("log_dir", "app/log").replace('"', '')
+    manifest_path = os.path.join(local_dir, "manifest", "opal_delivery_manifest.jsonl")
+    setup_logging(log_dir)
+    os.makedirs(local_dir, exist_ok=True)
+    # Content-addressed archive: identical files from earlier runs are not stored again
+    archive = ArchiveStore(os.path.join(local_dir, "archive"))
+
+    # Per-stage peak memory, aborting if the budget is exceeded
+    monitor = StageMonitor(resolve_max_memory_mb(args.max_memory_mb, delivery_conf), args.trace_memory).start()
+    # Only upload to SFTP if all SFTP parameters are provided
+    sftp_params = {
+        "host": args.sftp_host,
+        "port": args.sftp_port,
+        "username": args.sftp_username,
+        "private_key": args.sftp_private_key,
+        "remote_dir": args.sftp_remote_dir
+    }
+    sftp_args = sftp_params if all(sftp_params.values()) else None
+
+    # Run history: line count, sizes and stage timings of this run
+    recorder = RunRecorder(history_path(local_dir), "opal", args.environment, run_mode(args, sftp_args), db_adapter.name)
+
+    transport = None
+    exit_status = 0
+    try:
+        with monitor.stage("connect"):
+            conn = get_db_connection(db_adapter)
+            file_ext = delivery_conf.get('file_ext', DEFAULT_FILE_EXT).strip('"').strip()
+            source_names = fetch_file_names(conn)
+
+        # Without a file column SZBSFTP3 holds one file's lines: deliver the first queued file, as before
+        if len(source_names) > 1 and not file_column:
+            logging.warning(f"{len(source_names)} files queued in ACU.SZBSFTP0, but sftp_lines_file_column is not set, "
+                            f"so ACU.SZBSFTP3 lines cannot be attributed to them; delivering {source_names[0]} only.")
+            source_names = source_names[:1]
+
+        # (source name, output file name) for every pending 'put' row
+        files = []
+        for source_name in source_names:
+            file_name = source_name if source_name.endswith(file_ext) else f"{source_name}{file_ext}"
+            files.append((source_name, file_name))
+        if not files:
+            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+            files.append((None, f"{delivery_conf['filename_prefix']}_{timestamp}{file_ext}"))
+
+        if len(files) == 1:
+            source_name, file_name = files[0]
+            results = [(file_name, deliver_file(conn, source_name, file_name, args, delivery_conf, local_dir,
+                                                archive, manifest_path, sftp_args, file_column=file_column,
+                                                monitor=monitor, recorder=recorder))]
+            conn.close()
+        else:
+            conn.close()
+            logging.info(f"{len(files)} files queued for delivery, processing with {args.max_workers} workers")
+
+            # One authenticated SSH transport, one SFTP channel per upload
+            if sftp_args:
+                transport = open_sftp_transport(sftp_args)
+            # Workers overlap, so memory is accounted for the whole batch of files
+            cancel = threading.Event()
+            with monitor.stage("deliver_files"), ThreadPoolExecutor(max_workers=max(1, args.max_workers)) as executor:
+                futures = [
+                    executor.submit(deliver_file_worker, db_adapter, source_name, file_name, args, delivery_conf,
+                                    local_dir, archive, manifest_path, sftp_args, transport, file_column,
+                                    recorder=recorder, cancel=cancel)
+                    for source_name, file_name in files
+                ]
+                try:
+                    # Wait in short steps, so the memory budget can interrupt the main thread
+                    pending = futures
+                    while pending:
+                        _, pending = wait(pending, timeout=POLL_SECONDS)
+                    results = [future.result() for future in futures]
+                except BaseException:
+                    # On abort, files not yet started are dropped and files in progress stop at their next step
+                    cancel.set()
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        for file_name, status in results:
+            logging.info(f"Delivery result: {file_name} {status}")
+        failed = [file_name for file_name, status in results if status == "failed"]
+        if failed:
+            logging.error(f"{len(failed)} of {len(results)} files failed: {', '.join(failed)}")
+            exit_status = 1
+        recorder.status = "ok" if not failed else "partial" if len(failed) < len(results) else "failed"
+        # Unchanged files skip archive and upload, so such runs form their own series
+        skipped = sum(1 for _, status in results if status == "skipped")
+        if skipped:
+            recorder.mode += ", all skipped" if skipped == len(results) else ", some skipped"
+
+        logging.info("Process complete.")
+    except MemoryBudgetExceeded as e:
+        logging.error(f"Aborted: {e}")
+        recorder.status = "aborted"
+        exit_status = 1
+    except Exception as e:
+        logging.error(f"Fatal error: {e}", exc_info=True)
+        exit_status = 1
+    finally:
+        monitor.stop()
+        recorder.save(monitor.stages)
+        if transport:
+            transport.close()
+    monitor.log_summary()
+
+    # Expire archive entries past retention and remove blobs no longer referenced
+    archive.prune(configured_retention_days(delivery_conf))
+
+    # Clean up old files from local directory
+    cleanup_old_files(local_dir, days=7)
+    return exit_status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import os
+import sys
+import sqlite3
+import argparse
+
+# -------------------------------
+# Resolve base directory of the project
+# -------------------------------
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(BASE_DIR), "shared"))
+
+from load_harness import add_standin_arguments, ensure_standin, run_job
+from opal_extract_main import get_config, sftp_lines_file_column
+
+def queued_files(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(DISTINCT FILE_NAME) FROM SZBSFTP0 WHERE FILE_TYPE = 'put'").fetchone()[0]
+    finally:
+        conn.close()
+
+def check_file_column(opal_files):
+    # Without sftp_lines_file_column every queued file's lines would end up in the first file
+    if opal_files > 1 and not sftp_lines_file_column(get_config()["delivery"]):
+        print(f"{opal_files} queued files need sftp_lines_file_column = FILE_NAME in src/config.ini; "
+              f"without it OPAL delivers the first file with every file's lines.")
+        return False
+    return True
+
+# -------------------------------
+# Full OPAL run against the SQLite stand-in
+# -------------------------------
+def load_test(students, opal_files, db_path, regenerate, environment):
+    if not check_file_column(opal_files):
+        return 2
+    ensure_standin(db_path, students, regenerate, opal_files)
+    # An existing stand-in may queue more files than --opal_files
+    if not check_file_column(queued_files(db_path)):
+        return 2
+    return run_job("OPAL", BASE_DIR, "opal_extract_main.py", environment, db_path)
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the OPAL extract against a SQLite Banner stand-in")
+    add_standin_arguments(parser, BASE_DIR)
+    parser.add_argument("--opal_files", type=int, default=1, help="Queued OPAL files to generate")
+    args = parser.parse_args()
+
+    sys.exit(load_test(args.students, args.opal_files, args.sqlite_db, args.regenerate, args.environment))
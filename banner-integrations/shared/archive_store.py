@@ -0,0 +1,319 @@
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import configparser
+from datetime import datetime, timedelta
+from pipeline import compress_stream, CHUNK_SIZE
+
+# -------------------------------
+# Content-addressed archive of delivered files.
+# The uncompressed content of each deliverable is stored once, as a gzip
+# blob named by its SHA-256; index.jsonl maps every run and file name to
+# its blob and records how the deliverable was packaged (zip, gzip or
+# plain), so `python ../shared/archive_store.py restore <file>` rebuilds it.
+# Identical content from later runs only adds an index line.
+# -------------------------------
+
+INDEX_FILE = "index.jsonl"
+BLOB_DIR = "blobs"
+BLOB_SUFFIX = ".gz"
+
+# Blob compression level; archive copies are written once and rarely read
+BLOB_COMPRESSLEVEL = 6
+
+# Unreferenced blobs and temporary files younger than this are left alone by
+# garbage collection, so a run archiving at the same time is not disturbed
+GC_GRACE_SECONDS = 3600
+
+class ArchiveError(Exception):
+    pass
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class HashingReader:
+    # Hashes everything read through it, to verify a blob while restoring
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.digest.update(data)
+        return data
+
+class BlobWriter:
+    # Gzips content streamed into the archive to a temporary file, hashing it on the way
+    def __init__(self, blob_dir):
+        fd, self.tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=blob_dir)
+        self.raw = os.fdopen(fd, "wb")
+        self.gz = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=BLOB_COMPRESSLEVEL, mtime=0)
+        self.digest = hashlib.sha256()
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.gz.write(data)
+        self.digest.update(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def close(self):
+        # Returns the SHA-256 of the content written
+        if not self.raw.closed:
+            try:
+                self.gz.close()
+            finally:
+                self.raw.close()
+        return self.digest.hexdigest()
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+class ArchiveStore:
+    def __init__(self, archive_dir, run=None):
+        self.archive_dir = archive_dir
+        self.index_path = os.path.join(archive_dir, INDEX_FILE)
+        self.blob_dir = os.path.join(archive_dir, BLOB_DIR)
+        self.run = run or datetime.now().isoformat(timespec="seconds")
+        self._lock = threading.Lock()
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], f"{sha256}{BLOB_SUFFIX}")
+
+    # -------------------------------
+    # Archive one deliverable; thread-safe
+    # -------------------------------
+    def add(self, path, file_name=None, compress=None, arcname=None, sha256=None):
+        # path: uncompressed content; file_name: deliverable name, arcname: its entry name when compressed
+        # sha256: content hash if already computed while writing
+        # Returns (index entry, True if the blob was already stored)
+        sha256 = sha256 or file_sha256(path)
+        blob_path = self.blob_path(sha256)
+        stored = os.path.exists(blob_path)
+        if stored:
+            # Mark the blob as in use, so garbage collection's grace period applies
+            os.utime(blob_path)
+        else:
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(blob_path))
+            try:
+                with os.fdopen(fd, "wb") as raw, open(path, "rb") as src:
+                    with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=BLOB_COMPRESSLEVEL, mtime=0) as gz:
+                        shutil.copyfileobj(src, gz, CHUNK_SIZE)
+                os.replace(tmp_path, blob_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return self._index(file_name or os.path.basename(path), sha256, os.path.getsize(path), compress, arcname), stored
+
+    # -------------------------------
+    # Archive content while it is produced, without reading it back; thread-safe
+    # -------------------------------
+    def open_blob(self):
+        # Write the content to the returned BlobWriter, then pass it to add_blob(), or discard() it
+        os.makedirs(self.blob_dir, exist_ok=True)
+        return BlobWriter(self.blob_dir)
+
+    def add_blob(self, writer, file_name, compress=None, arcname=None):
+        # Returns (index entry, True if the blob was already stored)
+        try:
+            sha256 = writer.close()
+            blob_path = self.blob_path(sha256)
+            stored = os.path.exists(blob_path)
+            if stored:
+                os.utime(blob_path)
+                writer.discard()
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(writer.tmp_path, blob_path)
+        except BaseException:
+            writer.discard()
+            raise
+        return self._index(file_name, sha256, writer.bytes_written, compress, arcname), stored
+
+    def _index(self, file_name, sha256, size, compress, arcname):
+        entry = {
+            "run": self.run,
+            "archived_at": datetime.now().isoformat(timespec="seconds"),
+            "file_name": file_name,
+            "sha256": sha256,
+            "bytes": size,
+            "compression": compress,
+            "arcname": arcname
+        }
+        with self._lock:
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def entries(self):
+        if not os.path.exists(self.index_path):
+            return []
+        entries = []
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping unreadable archive index line in {self.index_path}")
+        return entries
+
+    def find(self, file_name, run=None):
+        # Latest entry for the file name, or the one archived by the given run
+        matches = [e for e in self.entries() if e["file_name"] == file_name and (run is None or e["run"] == run)]
+        return matches[-1] if matches else None
+
+    # -------------------------------
+    # Rebuild a deliverable from its blob, verifying the content hash
+    # -------------------------------
+    def restore(self, entry, dest_dir):
+        blob_path = self.blob_path(entry["sha256"])
+        if not os.path.exists(blob_path):
+            raise ArchiveError(f"Blob {entry['sha256']} of {entry['file_name']} is missing")
+        os.makedirs(dest_dir, exist_ok=True)
+        dest_path = os.path.join(dest_dir, entry["file_name"])
+        part_path = dest_path + ".part"
+        try:
+            with gzip.open(blob_path, "rb") as blob, open(part_path, "wb") as dst:
+                src = HashingReader(blob)
+                if entry.get("compression"):
+                    compress_stream(src, dst, entry["compression"], entry.get("arcname") or entry["file_name"])
+                else:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+            if src.digest.hexdigest() != entry["sha256"]:
+                raise ArchiveError(f"Blob {entry['sha256']} of {entry['file_name']} is corrupt")
+            os.replace(part_path, dest_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        return dest_path
+
+    # -------------------------------
+    # Retention: expire old index entries, then remove blobs nothing refers to
+    # -------------------------------
+    def prune(self, retention_days=0):
+        # retention_days 0 keeps every entry; blobs are garbage-collected either way
+        try:
+            if retention_days > 0:
+                cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat(timespec="seconds")
+                with self._lock:
+                    entries = self.entries()
+                    kept = [e for e in entries if e["archived_at"] >= cutoff]
+                    if len(kept) < len(entries):
+                        tmp_path = self.index_path + ".tmp"
+                        with open(tmp_path, "w", encoding="utf-8") as f:
+                            f.writelines(json.dumps(e) + "\n" for e in kept)
+                        os.replace(tmp_path, self.index_path)
+                        logging.info(f"Archive retention: expired {len(entries) - len(kept)} entries older than {retention_days} days")
+            return self.gc()
+        except OSError as e:
+            logging.error(f"Archive retention failed in {self.archive_dir}: {e}")
+            return 0, 0
+
+    def gc(self):
+        # Returns (blobs removed, bytes freed)
+        if not os.path.isdir(self.blob_dir):
+            return 0, 0
+        referenced = {e["sha256"] for e in self.entries()}
+        cutoff = time.time() - GC_GRACE_SECONDS
+        removed = freed = 0
+        for root, _, files in os.walk(self.blob_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                in_use = name.endswith(BLOB_SUFFIX) and name[:-len(BLOB_SUFFIX)] in referenced
+                if in_use or os.path.getmtime(path) > cutoff:
+                    continue
+                size = os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+                freed += size
+            if root != self.blob_dir and not os.listdir(root):
+                os.rmdir(root)
+        if removed:
+            logging.info(f"Archive garbage collection: removed {removed} unreferenced blobs, {freed} bytes")
+        return removed, freed
+
+    def usage(self):
+        # (index entries, blobs, bytes referenced by the index, bytes stored on disk)
+        entries = self.entries()
+        blobs = stored = 0
+        for root, _, files in os.walk(self.blob_dir):
+            for name in files:
+                if name.endswith(BLOB_SUFFIX):
+                    blobs += 1
+                    stored += os.path.getsize(os.path.join(root, name))
+        return len(entries), blobs, sum(e["bytes"] for e in entries), stored
+
+# -------------------------------
+# Archive settings of a job, from its src/config.ini
+# -------------------------------
+def configured_retention_days(delivery_conf):
+    return int(delivery_conf.get("archive_retention_days", "0").strip('"').strip() or 0)
+
+def delivery_settings(job_dir):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(job_dir, "src", "config.ini"))
+    return config["delivery"] if config.has_section("delivery") else {}
+
+def default_archive_dir(job_dir, delivery_conf):
+    local_dir = delivery_conf.get("local_dir", "app/data").strip('"')
+    return os.path.join(os.path.normpath(os.path.join(job_dir, local_dir)), "archive")
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed archive of delivered files")
+    parser.add_argument("--job_dir", default=".", help="Job directory (alma or opal) whose archive to use")
+    parser.add_argument("--archive_dir", help="Archive directory (default: from the job's config.ini)")
+    subparsers = parser.add_subparsers(dest="command")
+    list_parser = subparsers.add_parser("list", help="List archived deliverables")
+    list_parser.add_argument("--file", help="Only entries for this file name")
+    restore_parser = subparsers.add_parser("restore", help="Restore an archived deliverable")
+    restore_parser.add_argument("file_name", help="Deliverable file name, as listed")
+    restore_parser.add_argument("--run", help="Run timestamp, if the file name was archived by several runs")
+    restore_parser.add_argument("--dest", default=".", help="Directory to restore into")
+    gc_parser = subparsers.add_parser("gc", help="Expire old entries and remove unreferenced blobs")
+    gc_parser.add_argument("--retention_days", type=int,
+                           help="Expire entries older than this (0 = keep all; default from config.ini)")
+    args = parser.parse_args()
+
+    delivery_conf = delivery_settings(args.job_dir)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = ArchiveStore(args.archive_dir or default_archive_dir(args.job_dir, delivery_conf))
+    if args.command == "list":
+        for entry in store.entries():
+            if not args.file or entry["file_name"] == args.file:
+                print(f"{entry['run']:<20} {entry['file_name']:<45} {entry['bytes']:>12}  {entry['sha256'][:12]}")
+        entries, blobs, referenced, stored = store.usage()
+        print(f"{entries} entries in {blobs} blobs: {referenced} bytes archived, {stored} bytes stored")
+    elif args.command == "restore":
+        entry = store.find(args.file_name, args.run)
+        if entry is None:
+            print(f"{args.file_name} is not in the archive index {store.index_path}")
+            sys.exit(1)
+        try:
+            print(f"Restored {store.restore(entry, args.dest)} (archived by run {entry['run']})")
+        except (ArchiveError, OSError) as e:
+            print(f"Restore failed: {e}")
+            sys.exit(1)
+    elif args.command == "gc":
+        store.prune(configured_retention_days(delivery_conf) if args.retention_days is None else args.retention_days)
+    else:
+        parser.print_help()
+        sys.exit(2)
@@ -0,0 +1,167 @@
+import os
+import time
+import random
+import sqlite3
+import argparse
+from datetime import date, timedelta
+
+# -------------------------------
+# SQLite stand-in for the Banner views read by the ALMA and OPAL jobs.
+# Generates a database with the ALMA_* views, ACU.SZBSFTP0/ACU.SZBSFTP3 and
+# DUAL, scaled to any number of students with realistic child-row fan-out.
+# Use it with --sqlite_db to run either job end to end without Oracle.
+# -------------------------------
+
+# First generated PIDM; the range covers the PIDMs the ALMA test run selects
+FIRST_PIDM = 300000
+
+# Rows inserted per executemany call
+INSERT_BATCH = 50000
+
+# (rows per student, weight) for each child view
+ADDRESS_FANOUT = [(1, 60), (2, 30), (3, 10)]
+EMAIL_FANOUT = [(1, 50), (2, 40), (3, 10)]
+PHONE_FANOUT = [(0, 20), (1, 60), (2, 20)]
+
+SCHEMA = [
+    """CREATE TABLE ALMA_STUDENT_CHANGED (
+        SPRIDEN_PIDM INTEGER PRIMARY KEY, SPRIDEN_ID TEXT, SPRIDEN_FIRST_NAME TEXT, SPRIDEN_MI TEXT,
+        SPRIDEN_LAST_NAME TEXT, USER_NAME TEXT, USER_TITLE TEXT, GENDER TEXT, USER_GROUP TEXT,
+        CAMPUS_CODE TEXT, PREFERRED_LANGUAGE TEXT, USER_BIRTH_DATE TEXT, EXPIRY_DATE TEXT,
+        PURGE_DATE TEXT, BARCODE TEXT, STATUS TEXT)""",
+    """CREATE TABLE ALMA_ADDRESS_MA (
+        SPRADDR_PIDM INTEGER, PREFERRED TEXT, SPRADDR_STREET_LINE1 TEXT, SPRADDR_STREET_LINE2 TEXT,
+        SPRADDR_STREET_LINE3 TEXT, SPRADDR_CITY TEXT, SPRADDR_STAT_CODE TEXT, SPRADDR_ZIP TEXT,
+        ADDRESS_TYPE TEXT, START_DATE TEXT, END_DATE TEXT)""",
+    """CREATE TABLE ALMA_EMAIL (
+        EMAIL_PIDM INTEGER, PREFERRED TEXT, EMAIL_ADDRESS TEXT, EMAIL_TYPE TEXT)""",
+    """CREATE TABLE ALMA_PHONE_HOME (
+        PHONE_PIDM INTEGER, PREFERRED TEXT, PHONE_NUMBER TEXT, PHONE_TYPE TEXT)""",
+    """CREATE TABLE SZBSFTP0 (FILE_NAME TEXT, FILE_TYPE TEXT)""",
+    """CREATE TABLE SZBSFTP3 (FILE_NAME TEXT, LINE_NO INTEGER, SFTP_LINE TEXT)""",
+    """CREATE TABLE DUAL (DUMMY TEXT)""",
+]
+
+INDEXES = [
+    "CREATE INDEX ALMA_ADDRESS_MA_PIDM ON ALMA_ADDRESS_MA (SPRADDR_PIDM)",
+    "CREATE INDEX ALMA_EMAIL_PIDM ON ALMA_EMAIL (EMAIL_PIDM)",
+    "CREATE INDEX ALMA_PHONE_HOME_PIDM ON ALMA_PHONE_HOME (PHONE_PIDM)",
+    "CREATE INDEX SZBSFTP3_FILE_LINE ON SZBSFTP3 (FILE_NAME, LINE_NO)",
+]
+
+FIRST_NAMES = ["Olivia", "Jack", "Charlotte", "Noah", "Amelia", "William", "Isla", "Oliver", "Mia", "Thomas"]
+LAST_NAMES = ["Smith", "Nguyen", "Brown", "Wilson", "Taylor", "Johnson", "White", "Martin", "Anderson", "Lee"]
+CITIES = [("Sydney", "NSW", "2000"), ("Melbourne", "VIC", "3000"), ("Brisbane", "QLD", "4000"),
+          ("Canberra", "ACT", "2600"), ("Adelaide", "SA", "5000"), ("Ballarat", "VIC", "3350")]
+CAMPUSES = ["NSY", "STH", "MEL", "BRI", "CAN", "BAL"]
+
+def fanout(rng, weights):
+    counts, w = zip(*weights)
+    return rng.choices(counts, weights=w)[0]
+
+def iso(d):
+    return d.isoformat() if d else None
+
+# -------------------------------
+# Row generators, one tuple per view row
+# -------------------------------
+def student_rows(rng, students):
+    for pidm in range(FIRST_PIDM, FIRST_PIDM + students):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        birth = date(1960, 1, 1) + timedelta(days=rng.randrange(16000))
+        expiry = date(2026, 12, 31) + timedelta(days=365 * rng.randrange(4))
+        yield (pidm, f"S{pidm:08d}", first, rng.choice("ABCDEFGHJKLMNPRST"), last, f"{first} {last}",
+               rng.choice(["Mr", "Ms", "Mx", None]), rng.choice(["M", "F", "X"]), "STUDENT",
+               rng.choice(CAMPUSES), "en", iso(birth), iso(expiry), iso(expiry + timedelta(days=365)),
+               f"B{pidm:010d}", "ACTIVE")
+
+def address_rows(rng, students):
+    for pidm in range(FIRST_PIDM, FIRST_PIDM + students):
+        for i in range(fanout(rng, ADDRESS_FANOUT)):
+            city, state, postcode = rng.choice(CITIES)
+            yield (pidm, "Y" if i == 0 else None, f"{rng.randrange(1, 400)} {rng.choice(LAST_NAMES)} Street",
+                   rng.choice([None, f"Unit {rng.randrange(1, 60)}"]), None, city, state, postcode,
+                   ["MA", "PR", "TM"][i], iso(date(2020, 1, 1) + timedelta(days=rng.randrange(1500))), None)
+
+def email_rows(rng, students):
+    for pidm in range(FIRST_PIDM, FIRST_PIDM + students):
+        for i in range(fanout(rng, EMAIL_FANOUT)):
+            yield (pidm, "Y" if i == 0 else None, f"s{pidm}.{i}@example.edu.au", ["SCHL", "PERS", "WORK"][i])
+
+def phone_rows(rng, students):
+    for pidm in range(FIRST_PIDM, FIRST_PIDM + students):
+        for i in range(fanout(rng, PHONE_FANOUT)):
+            yield (pidm, "Y" if i == 0 else None, f"04{rng.randrange(10**8):08d}", ["HOME", "MOBL"][i])
+
+def opal_rows(students, file_names):
+    # Header line per file, then one pipe-delimited body line per student (round robin across files)
+    for file_name in file_names:
+        yield (file_name, 0, f"H|{file_name}|{date.today().isoformat()}")
+    for offset in range(students):
+        pidm = FIRST_PIDM + offset
+        yield (file_names[offset % len(file_names)], 1, f"D|S{pidm:08d}|{pidm}|ENROLLED|{CAMPUSES[offset % len(CAMPUSES)]}")
+
+def insert_rows(conn, table, rows):
+    placeholders = None
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INSERT_BATCH:
+            placeholders = placeholders or ",".join("?" * len(row))
+            conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        placeholders = placeholders or ",".join("?" * len(batch[0]))
+        conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", batch)
+        count += len(batch)
+    return count
+
+# -------------------------------
+# Build the stand-in database
+# -------------------------------
+def generate(db_path, students, opal_files=1, seed=42):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+    counts = {
+        "ALMA_STUDENT_CHANGED": insert_rows(conn, "ALMA_STUDENT_CHANGED", student_rows(rng, students)),
+        "ALMA_ADDRESS_MA": insert_rows(conn, "ALMA_ADDRESS_MA", address_rows(rng, students)),
+        "ALMA_EMAIL": insert_rows(conn, "ALMA_EMAIL", email_rows(rng, students)),
+        "ALMA_PHONE_HOME": insert_rows(conn, "ALMA_PHONE_HOME", phone_rows(rng, students)),
+    }
+    file_names = [f"OPAL_EXTRACT_{i + 1:02d}" for i in range(opal_files)]
+    counts["SZBSFTP0"] = insert_rows(conn, "SZBSFTP0", ((name, "put") for name in file_names))
+    counts["SZBSFTP3"] = insert_rows(conn, "SZBSFTP3", opal_rows(students, file_names))
+    counts["DUAL"] = insert_rows(conn, "DUAL", [("X",)])
+
+    for statement in INDEXES:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+    return counts
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a SQLite stand-in of the Banner views")
+    parser.add_argument("--output", required=True, help="SQLite database file to create (overwritten)")
+    parser.add_argument("--students", type=int, default=100000, help="Number of students to generate")
+    parser.add_argument("--opal_files", type=int, default=1, help="Number of queued OPAL 'put' files")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for repeatable data")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.output, args.students, args.opal_files, args.seed)
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+    print(f"Generated {args.output} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,107 @@
+import os
+import re
+import sqlite3
+
+# -------------------------------
+# Thin DB adapter under every database call of the extract jobs.
+# Each adapter's connect() returns a DB-API connection, so the fetch and
+# preload functions run unchanged against Oracle or the local SQLite
+# stand-in of the Banner views (see banner_standin.py).
+# -------------------------------
+
+# Oracle Instant Client used for Thick mode outside Docker
+INSTANT_CLIENT_DIR = r"C:\\oracle\\instantclient_21_19"
+
+_oracle_client_initialised = False
+
+# -------------------------------
+# Oracle (cx_Oracle), imported only when used
+# -------------------------------
+class OracleAdapter:
+    name = "oracle"
+
+    def __init__(self, db_conf):
+        self.db_conf = db_conf
+
+    def describe(self):
+        return self.db_conf["db_name"]
+
+    def connect(self):
+        global _oracle_client_initialised
+        import cx_Oracle
+
+        # Initialize Oracle Client for Thick mode (only outside Docker)
+        running_in_docker = os.getenv("RUNNING_IN_DOCKER", "true").lower()
+        if running_in_docker != "true" and not _oracle_client_initialised:
+            cx_Oracle.init_oracle_client(lib_dir=INSTANT_CLIENT_DIR)
+            _oracle_client_initialised = True
+
+        dsn = cx_Oracle.makedsn(self.db_conf["db_url"], self.db_conf["db_port"], service_name=self.db_conf["db_name"])
+        # threaded: pipeline stages use the connection from worker threads
+        return cx_Oracle.connect(
+            user=self.db_conf["db_username"],
+            password=self.db_conf["db_password"],
+            dsn=dsn,
+            threaded=True
+        )
+
+# -------------------------------
+# SQLite stand-in for load testing without a Banner instance
+# -------------------------------
+# Oracle numbered binds (:1) become SQLite numbered binds (?1)
+_ORACLE_BIND = re.compile(r"(?<![\w:]):(\d+)\b")
+
+class _SQLiteCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    @property
+    def arraysize(self):
+        return self._cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, value):
+        self._cursor.arraysize = value
+
+    def execute(self, query, params=()):
+        self._cursor.execute(_ORACLE_BIND.sub(r"?\1", query), params)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class _SQLiteConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return _SQLiteCursor(self._conn.cursor())
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+class SQLiteAdapter:
+    name = "sqlite"
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def describe(self):
+        return f"SQLite stand-in {self.db_path}"
+
+    def connect(self):
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f"SQLite stand-in not found: {self.db_path} (create it with banner_standin.py)")
+        # check_same_thread off: pipeline stages use the connection from worker threads
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # ACU.SZBSFTP* views are addressed through the ACU schema name
+        conn.execute("ATTACH DATABASE ? AS ACU", (self.db_path,))
+        return _SQLiteConnection(conn)
+
+def get_db_adapter(db_conf, sqlite_db=None):
+    if sqlite_db:
+        return SQLiteAdapter(sqlite_db)
+    return OracleAdapter(db_conf)
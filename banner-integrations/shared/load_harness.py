@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import subprocess
+
+import banner_standin
+
+# -------------------------------
+# Load test scaffolding shared by alma/tests/load_test.py and
+# opal/tests/load_test.py: generates the SQLite stand-in if needed, runs
+# the job against it in a child process and reports the exit code,
+# wall-clock time and peak RSS.
+# -------------------------------
+
+def default_standin_db(job_dir):
+    return os.path.join(job_dir, "app", "data", "standin", "banner_standin.db")
+
+def add_standin_arguments(parser, job_dir):
+    parser.add_argument("--students", type=int, default=1000000, help="Students to generate")
+    parser.add_argument("--sqlite_db", default=default_standin_db(job_dir), help="Stand-in database (generated if missing)")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate the stand-in even if it exists")
+    parser.add_argument("--environment", default="DEV", choices=["DEV", "PREPROD", "PROD"], help="Config section to use")
+
+# -------------------------------
+# Peak resident set size of finished child processes, in MB
+# -------------------------------
+def peak_child_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None  # Not available on Windows
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def ensure_standin(db_path, students, regenerate, opal_files=1):
+    if regenerate or not os.path.exists(db_path):
+        start = time.perf_counter()
+        banner_standin.generate(db_path, students, opal_files)
+        print(f"Generated {students} students in {time.perf_counter() - start:.1f}s: {db_path}")
+
+# -------------------------------
+# Full run of src/<script> against the stand-in; returns its exit code
+# -------------------------------
+def run_job(job, job_dir, script, environment, db_path, extra_args=()):
+    cmd = [sys.executable, os.path.join("src", script),
+           "--environment", environment, "--sqlite_db", db_path, *extra_args]
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=job_dir)
+    wall = time.perf_counter() - start
+    peak = peak_child_rss_mb()
+
+    print(f"{job} run exit code: {result.returncode}")
+    print(f"Wall-clock: {wall:.1f}s")
+    print(f"Peak RSS: {peak:.0f} MB" if peak is not None else "Peak RSS: not available on this platform")
+    return result.returncode
@@ -0,0 +1,279 @@
+import os
+import sys
+import time
+import socket
+import argparse
+import importlib
+import configparser
+from statistics import median
+from datetime import datetime
+
+from db_adapter import get_db_adapter
+
+# -------------------------------
+# Connection and fetch-throughput diagnostics for the ALMA and OPAL jobs,
+# run as tests/test_oracle_connect.py from either job with its config.ini.
+# Measures connect time, round-trip latency (SELECT 1 FROM DUAL) and fetch
+# throughput from the views the jobs read at several arraysizes, then
+# recommends fetch settings. With SFTP parameters it also times the SSH
+# handshake and an upload. --sqlite_db runs it against the stand-in.
+# -------------------------------
+
+# Directory holding the alma and opal jobs
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Views read by each job, with the constant in the job's module that sets the arraysize they are fetched with
+VIEWS = {
+    "alma": ("alma_extract_main", {
+        "ALMA_STUDENT_CHANGED": "FETCH_ARRAYSIZE",
+        "ALMA_ADDRESS_MA": "PRELOAD_ARRAYSIZE",
+        "ALMA_EMAIL": "PRELOAD_ARRAYSIZE",
+        "ALMA_PHONE_HOME": "PRELOAD_ARRAYSIZE",
+    }),
+    "opal": ("opal_extract_main", {"ACU.SZBSFTP3": "FETCH_ARRAYSIZE"}),
+}
+
+DEFAULT_ARRAYSIZES = "100,500,1000,2000,5000"
+
+# The smallest arraysize within this share of the best throughput is recommended, as it buffers fewer rows
+NEAR_BEST = 0.05
+
+# prefetchrows is only recommended if it improves throughput by more than this
+PREFETCH_GAIN = 0.05
+
+# -------------------------------
+# Load configuration from the job's config.ini
+# -------------------------------
+def get_config(job_dir):
+    config_path = os.path.join(job_dir, "src", "config.ini")
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return config
+
+def describe_times(times):
+    ms = sorted(t * 1000 for t in times)
+    return f"min {ms[0]:.1f} ms, median {median(ms):.1f} ms, max {ms[-1]:.1f} ms"
+
+def current_arraysize(job, constant):
+    # The job's current setting, or None if its module cannot be imported here
+    src_dir = os.path.join(ROOT_DIR, job, "src")
+    if src_dir not in sys.path:
+        sys.path.append(src_dir)
+    try:
+        return getattr(importlib.import_module(VIEWS[job][0]), constant, None)
+    except ImportError:
+        return None
+
+# -------------------------------
+# Connect time and round-trip latency
+# -------------------------------
+def measure_connect(db_adapter, count):
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        conn = db_adapter.connect()
+        times.append(time.perf_counter() - start)
+        conn.close()
+    return times
+
+def measure_round_trips(conn, count):
+    cursor = conn.cursor()
+    times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        cursor.execute("SELECT 1 FROM DUAL")
+        cursor.fetchone()
+        times.append(time.perf_counter() - start)
+    cursor.close()
+    return times
+
+# -------------------------------
+# Fetch throughput from one view at one arraysize
+# -------------------------------
+def supports_prefetch(conn):
+    # cursor.prefetchrows needs cx_Oracle 8 and applies to Oracle only
+    cursor = conn.cursor()
+    supported = hasattr(cursor, "prefetchrows")
+    cursor.close()
+    return supported
+
+def fetch_rate(conn, view, arraysize, max_rows, prefetchrows=None):
+    # Returns (rows, seconds) for fetching up to max_rows rows, one fetchmany() per round trip
+    cursor = conn.cursor()
+    cursor.arraysize = arraysize
+    if prefetchrows:
+        cursor.prefetchrows = prefetchrows
+    rows = 0
+    start = time.perf_counter()
+    cursor.execute(f"SELECT * FROM {view}")
+    while rows < max_rows:
+        batch = cursor.fetchmany(arraysize)
+        if not batch:
+            break
+        rows += len(batch)
+    elapsed = time.perf_counter() - start
+    cursor.close()
+    return rows, elapsed
+
+def best_rate(conn, view, arraysize, max_rows, repeat, prefetchrows=None):
+    # Fastest of repeat fetches: (rows, seconds, rows/s)
+    rows, elapsed = min((fetch_rate(conn, view, arraysize, max_rows, prefetchrows) for _ in range(repeat)),
+                        key=lambda result: result[1])
+    return rows, elapsed, rows / elapsed if elapsed else 0.0
+
+def measure_view(conn, view, arraysizes, max_rows, repeat, round_trip, prefetch):
+    # Returns {arraysize: rows/s}, the recommended arraysize and the prefetchrows gain (or None)
+    fetch_rate(conn, view, max(arraysizes), max_rows)  # warm-up, so the first arraysize is not penalised
+    rates = {}
+    for arraysize in arraysizes:
+        rows, elapsed, rates[arraysize] = best_rate(conn, view, arraysize, max_rows, repeat)
+        trips = -(-rows // arraysize) + 1
+        latency_share = min(1.0, trips * round_trip / elapsed) if elapsed else 0.0
+        print(f"  arraysize {arraysize:>6}: {rows} rows in {elapsed:.2f}s, {rates[arraysize]:,.0f} rows/s, "
+              f"{trips} round trips (~{latency_share:.0%} of the time in round-trip latency)")
+    best = max(rates.values())
+    recommended = min(a for a in arraysizes if rates[a] >= best * (1 - NEAR_BEST))
+
+    gain = None
+    if prefetch:
+        _, _, rate = best_rate(conn, view, recommended, max_rows, repeat, prefetchrows=recommended + 1)
+        gain = rate / rates[recommended] - 1 if rates[recommended] else 0.0
+        print(f"  arraysize {recommended:>6} with prefetchrows {recommended + 1}: {rate:,.0f} rows/s ({gain:+.0%})")
+    return rates, recommended, gain
+
+# -------------------------------
+# SFTP handshake and upload throughput
+# -------------------------------
+def sftp_diagnostics(sftp_args, upload_mb):
+    import paramiko  # only needed when SFTP parameters are supplied
+
+    key = paramiko.RSAKey.from_private_key_file(sftp_args["private_key"])
+    start = time.perf_counter()
+    sock = socket.create_connection((sftp_args["host"], int(sftp_args["port"])), timeout=30)
+    print(f"  TCP connect: {(time.perf_counter() - start) * 1000:.1f} ms")
+    transport = paramiko.Transport(sock)
+    try:
+        start = time.perf_counter()
+        transport.start_client(timeout=30)
+        print(f"  SSH handshake: {(time.perf_counter() - start) * 1000:.1f} ms")
+        start = time.perf_counter()
+        transport.auth_publickey(sftp_args["username"], key)
+        print(f"  Authentication: {(time.perf_counter() - start) * 1000:.1f} ms")
+        start = time.perf_counter()
+        sftp = paramiko.SFTPClient.from_transport(transport)
+        print(f"  SFTP channel: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # Random data, so the figure is not inflated by compression on the link
+        remote_path = os.path.join(sftp_args["remote_dir"], f"acu_diagnostics_{datetime.now():%Y%m%d%H%M%S}.tmp")
+        block = os.urandom(1024 * 1024)
+        start = time.perf_counter()
+        with sftp.open(remote_path, "wb") as remote:
+            remote.set_pipelined(True)
+            for _ in range(upload_mb):
+                remote.write(block)
+        elapsed = time.perf_counter() - start
+        sftp.remove(remote_path)
+        sftp.close()
+        print(f"  Upload: {upload_mb} MB in {elapsed:.2f}s, {upload_mb / elapsed:.1f} MB/s (test file removed)")
+    finally:
+        transport.close()
+
+# -------------------------------
+# Run all diagnostics and print recommendations
+# -------------------------------
+def diagnose(job_dir, env, sqlite_db, jobs, arraysizes, max_rows, repeat, connects, round_trips, sftp_args, upload_mb):
+    config = get_config(job_dir)
+    if env not in config:
+        print(f"Environment '{env}' not found in config.ini")
+        return 1
+    db_adapter = get_db_adapter(config[env], sqlite_db)
+
+    print(f"Database: {db_adapter.describe()}")
+    if db_adapter.name == "sqlite":
+        print("The stand-in runs in-process: figures check the tool, not the network")
+    try:
+        connect_times = measure_connect(db_adapter, connects)
+        conn = db_adapter.connect()
+    except Exception as e:
+        print(f"Connection failed: {e}")
+        return 1
+    print(f"Connection successful to {env}")
+    print(f"Connect: {describe_times(connect_times)} over {connects} connections")
+
+    trip_times = measure_round_trips(conn, round_trips)
+    round_trip = median(trip_times)
+    print(f"Round trip (SELECT 1 FROM DUAL): {describe_times(trip_times)} over {round_trips} queries")
+
+    prefetch = supports_prefetch(conn)
+    recommendations = []
+    for job in jobs:
+        module_name, views = VIEWS[job]
+        for view, constant in views.items():
+            print(f"\nFetch throughput from {view} (up to {max_rows} rows):")
+            try:
+                rates, recommended, gain = measure_view(conn, view, arraysizes, max_rows, repeat, round_trip, prefetch)
+            except Exception as e:
+                print(f"  Skipped: {e}")
+                continue
+            current = current_arraysize(job, constant)
+            note = f"{constant} in {job}/src/{module_name}.py"
+            if current:
+                note += f" is {current}"
+                if current in rates and rates[recommended] > rates[current] * (1 + NEAR_BEST):
+                    note += f", {rates[recommended] / rates[current] - 1:+.0%} rows/s"
+            if gain is not None:
+                note += (f"; prefetchrows {recommended + 1} gives {gain:+.0%}" if gain > PREFETCH_GAIN
+                         else "; keep the default prefetchrows")
+            recommendations.append(f"  {view}: arraysize {recommended} ({note})")
+    conn.close()
+
+    if sftp_args:
+        print(f"\nSFTP {sftp_args['username']}@{sftp_args['host']}:{sftp_args['port']}:")
+        try:
+            sftp_diagnostics(sftp_args, upload_mb)
+        except Exception as e:
+            print(f"  SFTP check failed: {e}")
+    else:
+        print("\nSFTP parameters not supplied, skipping SFTP check.")
+
+    if recommendations:
+        print("\nRecommended fetch settings:")
+        print("\n".join(recommendations))
+        if not prefetch:
+            print("  prefetchrows not measured (needs cx_Oracle 8 against Oracle)")
+    return 0
+
+# -------------------------------
+# Parse command-line arguments; job_dir is the job (alma or opal) whose config.ini to use
+# -------------------------------
+def main(job_dir):
+    parser = argparse.ArgumentParser(description="Oracle connection, latency and fetch-throughput diagnostics")
+    parser.add_argument("--environment", required=True, choices=["DEV", "PREPROD", "PROD"], help="Target environment")
+    parser.add_argument("--sqlite_db", help="Diagnose the SQLite stand-in instead of Oracle")
+    parser.add_argument("--jobs", nargs="+", choices=sorted(VIEWS), default=sorted(VIEWS), help="Views of these jobs to fetch from")
+    parser.add_argument("--arraysizes", default=DEFAULT_ARRAYSIZES, help="Comma-separated arraysizes to compare")
+    parser.add_argument("--max_rows", type=int, default=100000, help="Rows fetched per measurement")
+    parser.add_argument("--repeat", type=int, default=2, help="Fetches per arraysize; the fastest counts")
+    parser.add_argument("--connects", type=int, default=3, help="Connections to time")
+    parser.add_argument("--round_trips", type=int, default=20, help="SELECT 1 FROM DUAL queries to time")
+    parser.add_argument("--sftp_host")
+    parser.add_argument("--sftp_port", type=int, default=22)
+    parser.add_argument("--sftp_username")
+    parser.add_argument("--sftp_private_key")
+    parser.add_argument("--sftp_remote_dir")
+    parser.add_argument("--upload_mb", type=int, default=8, help="Size of the SFTP test upload")
+    args = parser.parse_args()
+
+    # Only check SFTP if all SFTP parameters are provided
+    sftp_params = {
+        "host": args.sftp_host,
+        "port": args.sftp_port,
+        "username": args.sftp_username,
+        "private_key": args.sftp_private_key,
+        "remote_dir": args.sftp_remote_dir
+    }
+    sftp_args = sftp_params if all(sftp_params.values()) else None
+    arraysizes = sorted(int(size) for size in args.arraysizes.split(",") if size.strip())
+
+    return diagnose(job_dir, args.environment, args.sqlite_db, args.jobs, arraysizes, args.max_rows, max(1, args.repeat),
+                    args.connects, args.round_trips, sftp_args, args.upload_mb)
@@ -0,0 +1,272 @@
+import gzip
+import logging
+import queue
+import shutil
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+
+# -------------------------------
+# Streaming pipeline for the extract jobs.
+# Each stage is a generator function that receives the previous stage's
+# output as an iterator; stages run on their own threads and are connected
+# by bounded queues, so fetch, render, compress and deliver overlap while
+# memory stays limited to a few batches per stage.
+# -------------------------------
+
+# Items buffered between two stages before the producer blocks
+DEFAULT_QUEUE_SIZE = 8
+
+# Read/write buffer size used when streaming files
+CHUNK_SIZE = 1024 * 1024
+
+# Archive suffix for each supported compression mode
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zip": ".zip"}
+
+# How often blocked stages check whether another stage has failed
+POLL_SECONDS = 0.1
+
+_END = object()
+
+class PipelineError(Exception):
+    def __init__(self, stage_name, error):
+        super().__init__(f"Pipeline stage '{stage_name}' failed: {error}")
+        self.stage_name = stage_name
+        self.error = error
+
+class PipelineCancelled(Exception):
+    pass
+
+class _StageStopped(Exception):
+    pass
+
+def raise_if_cancelled(cancel):
+    # cancel: threading.Event set by the caller to stop work running on other threads
+    if cancel is not None and cancel.is_set():
+        raise PipelineCancelled("Cancelled")
+
+# -------------------------------
+# A named stage with its run statistics
+# -------------------------------
+class Stage:
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.items_in = 0
+        self.items_out = 0
+        self.duration = 0.0
+
+def _queue_get(q, *stop_events):
+    while True:
+        try:
+            return q.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if any(event.is_set() for event in stop_events):
+                raise _StageStopped()
+
+def _queue_put(q, item, *stop_events):
+    # Producers stop when the pipeline aborts or nobody reads their output
+    while True:
+        if any(event.is_set() for event in stop_events):
+            raise _StageStopped()
+        try:
+            q.put(item, timeout=POLL_SECONDS)
+            return
+        except queue.Full:
+            continue
+
+# -------------------------------
+# Run stages concurrently; returns the items yielded by the last stage.
+# Setting cancel stops the stages within POLL_SECONDS and raises PipelineCancelled.
+# -------------------------------
+def run_pipeline(stages, queue_size=DEFAULT_QUEUE_SIZE, cancel=None):
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages[1:]]
+    abort = threading.Event()
+    # consumer_done[i] is set once the consumer of queues[i] has finished
+    consumer_done = [threading.Event() for _ in queues]
+    errors = []
+    results = []
+
+    def upstream(index, stage):
+        while True:
+            item = _queue_get(queues[index - 1], abort)
+            if item is _END:
+                return
+            stage.items_in += 1
+            yield item
+
+    def run_stage(index, stage):
+        start = time.perf_counter()
+        is_last = index == len(stages) - 1
+        try:
+            outputs = stage.func(upstream(index, stage)) if index > 0 else stage.func()
+            for item in outputs:
+                stage.items_out += 1
+                if is_last:
+                    results.append(item)
+                else:
+                    _queue_put(queues[index], item, abort, consumer_done[index])
+            if not is_last:
+                _queue_put(queues[index], _END, abort, consumer_done[index])
+        except _StageStopped:
+            pass
+        except BaseException as e:
+            errors.append((stage.name, e))
+            abort.set()
+        finally:
+            stage.duration = time.perf_counter() - start
+            if index > 0:
+                consumer_done[index - 1].set()
+
+    threads = [
+        threading.Thread(target=run_stage, args=(index, stage), name=f"pipeline-{stage.name}", daemon=True)
+        for index, stage in enumerate(stages)
+    ]
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                if cancel is not None and cancel.is_set():
+                    abort.set()
+                thread.join(POLL_SECONDS)
+    except BaseException:
+        abort.set()
+        raise
+
+    for stage in stages:
+        logging.info(f"Pipeline stage {stage.name}: {stage.items_in} in, {stage.items_out} out, {stage.duration:.2f}s")
+    logging.info(f"Pipeline finished in {time.perf_counter() - start:.2f}s")
+
+    if errors:
+        stage_name, error = errors[0]
+        raise PipelineError(stage_name, error) from error
+    if abort.is_set():
+        raise PipelineCancelled("Pipeline cancelled")
+    return results
+
+# -------------------------------
+# Common stage building blocks
+# -------------------------------
+def fetch_batches(cursor, arraysize):
+    # Yield rows one round trip at a time instead of fetchall()
+    cursor.arraysize = arraysize
+    while True:
+        rows = cursor.fetchmany(arraysize)
+        if not rows:
+            return
+        yield rows
+
+def write_through(items, fileobj):
+    # Write each chunk to fileobj and pass it downstream unchanged
+    for data in items:
+        fileobj.write(data)
+        yield data
+
+def write_all(items, fileobj):
+    # Terminal stage: write each chunk to fileobj, yielding the bytes written
+    for data in items:
+        fileobj.write(data)
+        yield len(data)
+
+def compress_chunks(items, compress, arcname):
+    # Compress a stream of byte chunks, yielding compressed chunks as they are produced
+    sink = _ChunkSink()
+    with open_compressor(sink, compress, arcname) as compressor:
+        for data in items:
+            compressor.write(data)
+            compressed = sink.drain()
+            if compressed:
+                yield compressed
+    compressed = sink.drain()
+    if compressed:
+        yield compressed
+
+class _ChunkSink:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+# -------------------------------
+# Count the bytes written through to an underlying file object
+# -------------------------------
+class CountingWriter:
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+class CancellableReader:
+    # Reads stop with PipelineCancelled once cancel is set
+    def __init__(self, fileobj, cancel):
+        self.fileobj = fileobj
+        self.cancel = cancel
+
+    def read(self, size=-1):
+        raise_if_cancelled(self.cancel)
+        return self.fileobj.read(size)
+
+# -------------------------------
+# Write the same bytes to several sinks; any failing sink aborts the write
+# -------------------------------
+class TeeWriter:
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, data):
+        for sink in self.sinks:
+            sink.write(data)
+        return len(data)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+# -------------------------------
+# Stream compression into a sequential (possibly remote) file object
+# -------------------------------
+def compressed_name(file_name, compress):
+    return f"{file_name}{COMPRESSION_SUFFIXES[compress]}" if compress else file_name
+
+@contextmanager
+def open_compressor(dst, compress, arcname):
+    # dst is written strictly sequentially, so it may be a remote handle
+    if compress == "gzip":
+        with gzip.GzipFile(filename=arcname, mode="wb", fileobj=dst) as gz:
+            yield gz
+    elif compress == "zip":
+        with zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED) as zipf:
+            # Dated now and world-readable, as zipf.write() records a freshly written file
+            info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+            info.external_attr = 0o644 << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            # The size is not known up front, so the entry is always written as ZIP64;
+            # otherwise writing fails once it passes ZIP64_LIMIT (2 GiB uncompressed)
+            with zipf.open(info, "w", force_zip64=True) as entry:
+                yield entry
+    else:
+        raise ValueError(f"Unsupported compression: {compress}")
+
+def compress_stream(src, dst, compress, arcname):
+    with open_compressor(dst, compress, arcname) as compressor:
+        shutil.copyfileobj(src, compressor, CHUNK_SIZE)
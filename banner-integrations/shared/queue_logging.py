@@ -0,0 +1,36 @@
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# -------------------------------
+# Non-blocking logging.
+# Log calls only enqueue the record; a QueueListener thread does the
+# console and rotating-file I/O, so tracing inside hot loops does not
+# stall the pipeline on disk writes.
+# -------------------------------
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
+
+# Rotate the log file at 5 MB, keeping 3 backups
+MAX_LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+
+def start_queue_logging(log_file, level=logging.INFO):
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [
+        logging.StreamHandler(),
+        RotatingFileHandler(log_file, maxBytes=MAX_LOG_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(QueueHandler(log_queue))
+    listener.start()
+    # Flush queued records on every exit path, including early returns
+    atexit.register(listener.stop)
+    return listener
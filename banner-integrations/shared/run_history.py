@@ -0,0 +1,221 @@
+import os
+import sys
+import time
+import logging
+import sqlite3
+import argparse
+import threading
+import configparser
+from datetime import datetime
+from statistics import mean, pstdev
+
+# -------------------------------
+# Run history of the extract jobs.
+# Every run records its row count, byte size, duration and per-stage
+# timings in a local SQLite database, which outlives the rotating logs.
+# `python ../shared/run_history.py report` shows recent runs and flags those
+# whose duration or rows/sec deviates from the rolling baseline.
+# -------------------------------
+
+HISTORY_DB = os.path.join("history", "run_history.db")
+
+# Previous successful runs forming the baseline, and the minimum needed to judge
+DEFAULT_WINDOW = 10
+MIN_BASELINE = 5
+
+# A run is flagged when it is this many standard deviations from the baseline mean
+# and at least MIN_DEVIATION (relative) away from it
+DEFAULT_THRESHOLD = 3.0
+MIN_DEVIATION = 0.2
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, job TEXT NOT NULL, environment TEXT, mode TEXT, source TEXT,
+        started_at TEXT, duration REAL, status TEXT, rows INTEGER, bytes INTEGER, files INTEGER)""",
+    """CREATE TABLE IF NOT EXISTS stages (
+        run_id INTEGER NOT NULL REFERENCES runs (id), name TEXT, duration REAL, peak_rss_mb REAL)""",
+    "CREATE INDEX IF NOT EXISTS runs_series ON runs (job, environment, mode, source, id)",
+    "CREATE INDEX IF NOT EXISTS stages_run ON stages (run_id)",
+]
+
+def history_path(local_dir):
+    return os.path.join(local_dir, HISTORY_DB)
+
+def connect(db_path):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+# -------------------------------
+# Collects one run's figures; save() writes them with the monitor's stage stats
+# -------------------------------
+class RunRecorder:
+    def __init__(self, db_path, job, environment, mode, source):
+        self.db_path = db_path
+        self.job = job
+        self.environment = environment
+        self.mode = mode
+        self.source = source
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.start = time.perf_counter()
+        self.status = "failed"
+        self.rows = 0
+        self.bytes = 0
+        self.files = 0
+        self._lock = threading.Lock()
+
+    def add(self, rows=0, bytes=0, files=1):
+        # Called once per output file, possibly from worker threads
+        with self._lock:
+            self.rows += rows
+            self.bytes += bytes
+            self.files += files
+
+    def save(self, stages=()):
+        # Run history is diagnostic; a failure to record must not fail the run
+        try:
+            conn = connect(self.db_path)
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO runs (job, environment, mode, source, started_at, duration, status, rows, bytes, files) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self.job, self.environment, self.mode, self.source, self.started_at,
+                     time.perf_counter() - self.start, self.status, self.rows, self.bytes, self.files))
+                conn.executemany("INSERT INTO stages (run_id, name, duration, peak_rss_mb) VALUES (?, ?, ?, ?)",
+                                 [(cursor.lastrowid, stage.name, stage.duration, stage.peak_rss_mb) for stage in stages])
+            conn.close()
+        except sqlite3.Error as e:
+            logging.error(f"Could not record run history in {self.db_path}: {e}")
+
+# -------------------------------
+# Regression detection against a rolling baseline
+# -------------------------------
+def rows_per_second(run):
+    return run["rows"] / run["duration"] if run["duration"] else None
+
+def deviation(value, baseline, threshold):
+    # Returns the relative deviation if value is an outlier against baseline, else None
+    if value is None or len(baseline) < MIN_BASELINE:
+        return None
+    centre, spread = mean(baseline), pstdev(baseline)
+    if not centre:
+        return None
+    relative = (value - centre) / centre
+    if abs(value - centre) > threshold * spread and abs(relative) >= MIN_DEVIATION:
+        return relative
+    return None
+
+def flag_runs(runs, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD):
+    # runs oldest first; each successful run is compared with the successful runs before it.
+    # Only slowdowns are flagged: longer duration or fewer rows/s.
+    flagged = []
+    ok_runs = []
+    for run in runs:
+        flags = []
+        if run["status"] == "ok":
+            baseline = ok_runs[-window:]
+            slower = deviation(run["duration"], [r["duration"] for r in baseline], threshold)
+            if slower is not None and slower > 0:
+                flags.append(f"duration {slower:+.0%}")
+            rate = deviation(rows_per_second(run), [rows_per_second(r) for r in baseline if rows_per_second(r)], threshold)
+            if rate is not None and rate < 0:
+                flags.append(f"rows/s {rate:+.0%}")
+            ok_runs.append(run)
+        flagged.append((run, flags))
+    return flagged
+
+def load_series(conn, job=None, environment=None):
+    conn.row_factory = sqlite3.Row
+    query = "SELECT * FROM runs"
+    conditions, params = [], []
+    for column, value in (("job", job), ("environment", environment)):
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    series = {}
+    for run in conn.execute(query + " ORDER BY id", params):
+        series.setdefault((run["job"], run["environment"], run["mode"], run["source"]), []).append(dict(run))
+    return series
+
+def stage_trend(conn, run, baseline):
+    # Latest run's stage durations against the baseline mean per stage
+    lines = []
+    ids = [r["id"] for r in baseline]
+    for name, duration in conn.execute("SELECT name, duration FROM stages WHERE run_id = ?", (run["id"],)):
+        past = [row[0] for row in conn.execute(
+            f"SELECT duration FROM stages WHERE name = ? AND run_id IN ({','.join('?' * len(ids))})", [name] + ids)] if ids else []
+        if past:
+            centre = mean(past)
+            # Relative change is noise for stages taking a few milliseconds
+            change = f"  ({(duration - centre) / centre:+.0%})" if centre >= 0.01 else ""
+            lines.append(f"    {name:<14} {duration:9.2f}s  baseline {centre:9.2f}s{change}")
+        else:
+            lines.append(f"    {name:<14} {duration:9.2f}s")
+    return lines
+
+def report(db_path, job=None, environment=None, last=20, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD):
+    # Prints one table per job/environment/mode/source series; returns True if a latest run is flagged
+    if not os.path.exists(db_path):
+        print(f"No run history at {db_path}")
+        return False
+    conn = connect(db_path)
+    latest_flagged = False
+    for (run_job, run_env, mode, source), runs in load_series(conn, job, environment).items():
+        flagged = flag_runs(runs, window, threshold)
+        print(f"\n{run_job} {run_env} ({mode}, {source}): {len(runs)} runs")
+        print(f"  {'Started':<20} {'Status':<8} {'Rows':>10} {'MB':>9} {'Seconds':>9} {'Rows/s':>10}  Flags")
+        for run, flags in flagged[-last:]:
+            rate = rows_per_second(run)
+            print(f"  {run['started_at']:<20} {run['status']:<8} {run['rows']:>10} {run['bytes'] / 1048576:>9.1f} "
+                  f"{run['duration']:>9.1f} {rate if rate is not None else 0:>10.0f}  {'REGRESSION: ' + ', '.join(flags) if flags else ''}")
+
+        ok_runs = [run for run in runs if run["status"] == "ok"]
+        if len(ok_runs) > 1:
+            half = len(ok_runs[-window * 2:]) // 2
+            recent = ok_runs[-window * 2:]
+            earlier, later = recent[:half], recent[half:]
+            change = (mean(r["duration"] for r in later) - mean(r["duration"] for r in earlier)) / mean(r["duration"] for r in earlier)
+            print(f"  Duration trend over last {len(recent)} successful runs: {change:+.0%}")
+            stage_lines = stage_trend(conn, ok_runs[-1], ok_runs[-window - 1:-1])
+            if stage_lines:
+                print("  Latest successful run by stage:")
+                print("\n".join(stage_lines))
+        if flagged and flagged[-1][1]:
+            latest_flagged = True
+    conn.close()
+    return latest_flagged
+
+# -------------------------------
+# History database of a job, from its src/config.ini local_dir
+# -------------------------------
+def default_db_path(job_dir):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(job_dir, "src", "config.ini"))
+    local_dir = config["delivery"].get("local_dir", "app/data").strip('"') if config.has_section("delivery") else "app/data"
+    return history_path(os.path.normpath(os.path.join(job_dir, local_dir)))
+
+# -------------------------------
+# Parse command-line arguments
+# -------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run history of the extract jobs")
+    subparsers = parser.add_subparsers(dest="command")
+    report_parser = subparsers.add_parser("report", help="Show recent runs and flag performance regressions")
+    report_parser.add_argument("--job_dir", default=".", help="Job directory (alma or opal) whose history to read")
+    report_parser.add_argument("--db", help="Run history database (default: from the job's config.ini)")
+    report_parser.add_argument("--job", help="Only this job (e.g. alma, alma_api, opal)")
+    report_parser.add_argument("--environment", choices=["DEV", "PREPROD", "PROD"], help="Only this environment")
+    report_parser.add_argument("--last", type=int, default=20, help="Runs to show per series")
+    report_parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Successful runs in the rolling baseline")
+    report_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Standard deviations from the baseline that flag a run")
+    args = parser.parse_args()
+
+    if args.command != "report":
+        parser.print_help()
+        sys.exit(2)
+    # Exit status 1 when the latest run of any series is flagged, for scheduled checks
+    sys.exit(1 if report(args.db or default_db_path(args.job_dir), args.job, args.environment, args.last, args.window, args.threshold) else 0)
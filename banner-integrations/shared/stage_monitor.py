@@ -0,0 +1,209 @@
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+import tracemalloc
+import _thread
+from contextlib import contextmanager
+
+# -------------------------------
+# Per-stage timing and memory accounting.
+# A sampler thread records RSS (and traced Python memory when enabled) for
+# the running stage. When max_memory_mb is exceeded it interrupts the main
+# thread, which aborts with MemoryBudgetExceeded naming the stage instead
+# of being OOM-killed without a trace. The interrupt is asynchronous: one
+# that arrives after the stage has ended is dropped, as the stage raises
+# MemoryBudgetExceeded on exit anyway.
+# -------------------------------
+
+# Seconds between memory samples
+SAMPLE_SECONDS = 0.2
+
+# Allocation sites listed in the diagnostic when tracemalloc is enabled
+TOP_ALLOCATIONS = 5
+
+MB = 1024 * 1024
+
+class MemoryBudgetExceeded(Exception):
+    def __init__(self, stage_name, rss_mb, max_memory_mb):
+        super().__init__(f"Memory budget of {max_memory_mb} MB exceeded in stage '{stage_name}' (RSS {rss_mb:.0f} MB)")
+        self.stage_name = stage_name
+        self.rss_mb = rss_mb
+        self.max_memory_mb = max_memory_mb
+
+# -------------------------------
+# Current resident set size in MB, or None where it cannot be read
+# -------------------------------
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    # Outside Linux only the peak is available, which is still a safe upper bound
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+# -------------------------------
+# Stage statistics collected during one run
+# -------------------------------
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.duration = 0.0
+        self.start_rss_mb = None
+        self.peak_rss_mb = None
+        self.peak_traced_mb = None
+
+    def observe(self, rss_mb, traced_mb):
+        if rss_mb is not None:
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, rss_mb)
+        if traced_mb is not None:
+            self.peak_traced_mb = max(self.peak_traced_mb or 0.0, traced_mb)
+
+    def describe(self):
+        text = f"Stage {self.name}: {self.duration:.2f}s"
+        if self.peak_rss_mb is not None:
+            text += f", peak RSS {self.peak_rss_mb:.0f} MB (start {self.start_rss_mb:.0f} MB)"
+        if self.peak_traced_mb is not None:
+            text += f", peak traced {self.peak_traced_mb:.0f} MB"
+        return text
+
+class StageMonitor:
+    def __init__(self, max_memory_mb=None, trace_memory=False, sample_seconds=SAMPLE_SECONDS):
+        self.max_memory_mb = max_memory_mb
+        self.trace_memory = trace_memory
+        self.sample_seconds = sample_seconds
+        self.stages = []
+        self.current = None
+        self.breach = None
+        self.breach_snapshot = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._previous_handler = None
+        if max_memory_mb and current_rss_mb() is None and not trace_memory:
+            logging.warning("RSS is not available on this platform; max_memory_mb is only enforced with memory tracing")
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # Signal handlers can only be installed from the main thread, which the sampler interrupts
+        if threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGINT, self._on_interrupt)
+        self._thread = threading.Thread(target=self._sample_loop, name="stage-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGINT, self._previous_handler)
+            self._previous_handler = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def _on_interrupt(self, signum, frame):
+        # The sampler's interrupt aborts the running stage; once no stage runs it is dropped
+        if self.breach:
+            if self.current is not None:
+                raise KeyboardInterrupt
+            return
+        # A real Ctrl-C
+        if callable(self._previous_handler):
+            self._previous_handler(signum, frame)
+        else:
+            raise KeyboardInterrupt
+
+    def _traced_mb(self):
+        if not tracemalloc.is_tracing():
+            return None
+        return tracemalloc.get_traced_memory()[0] / MB
+
+    def _sample(self, interrupt=True):
+        rss_mb = current_rss_mb()
+        traced_mb = self._traced_mb()
+        with self._lock:
+            stage = self.current
+            if stage is None:
+                return
+            stage.observe(rss_mb, traced_mb)
+            # Budget applies to RSS, or to traced memory where RSS is unavailable
+            used_mb = rss_mb if rss_mb is not None else traced_mb
+            if self.max_memory_mb and used_mb is not None and used_mb > self.max_memory_mb and not self.breach:
+                self.breach = (stage.name, used_mb)
+                # Snapshot now, while the allocations that broke the budget are still live
+                if tracemalloc.is_tracing():
+                    self.breach_snapshot = tracemalloc.take_snapshot()
+                if interrupt:
+                    _thread.interrupt_main()
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.sample_seconds):
+            self._sample()
+
+    # -------------------------------
+    # Wrap one stage of the job; raises MemoryBudgetExceeded on breach
+    # -------------------------------
+    @contextmanager
+    def stage(self, name):
+        stats = StageStats(name)
+        stats.start_rss_mb = current_rss_mb()
+        if tracemalloc.is_tracing() and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                self.current = stats
+                self.stages.append(stats)
+            yield stats
+            self._sample(interrupt=False)
+        except KeyboardInterrupt:
+            if not self.breach:
+                raise
+        finally:
+            try:
+                with self._lock:
+                    self.current = None
+            except KeyboardInterrupt:
+                # The sampler's interrupt landed while the stage was ending
+                if not self.breach:
+                    raise
+                self.current = None
+            stats.duration = time.perf_counter() - start
+            if tracemalloc.is_tracing():
+                stats.observe(None, tracemalloc.get_traced_memory()[1] / MB)
+            logging.info(stats.describe())
+        if self.breach:
+            self._raise_breach()
+
+    def _raise_breach(self):
+        stage_name, used_mb = self.breach
+        logging.error(f"Memory budget of {self.max_memory_mb} MB exceeded in stage '{stage_name}': {used_mb:.0f} MB in use")
+        for stats in self.stages:
+            logging.error(f"  {stats.describe()}")
+        if self.breach_snapshot:
+            for stat in self.breach_snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+                logging.error(f"  Top allocation: {stat}")
+        raise MemoryBudgetExceeded(stage_name, used_mb, self.max_memory_mb)
+
+    def log_summary(self):
+        for stats in self.stages:
+            logging.info(f"Memory summary: {stats.describe()}")
+
+# -------------------------------
+# Budget from --max_memory_mb, else config.ini max_memory_mb (0 or blank = unlimited)
+# -------------------------------
+def resolve_max_memory_mb(cli_value, delivery_conf):
+    if cli_value is not None:
+        return cli_value or None
+    value = delivery_conf.get("max_memory_mb", "").strip('"').strip()
+    return int(value) if value and int(value) > 0 else None